@@ -0,0 +1,165 @@
+# Headless benchmark of Jumpbot. Every level from levels.json (0 through 10) is
+# played with the same scripted inputs, once for the simulation only (World.step(),
+# in ticks per second) and once for the whole game frame (Game.draw_window(), in
+# frames per second). A third run of the frames traces the memory allocations. The
+# results are printed as JSON lines (one line per level), so they can be compared
+# between builds to catch performance regressions.
+# Usage: python benchmark.py [--ticks N] [--frames N] [--output FILE]
+import os
+
+# Run without a window, from the folder of the game (the assets are loaded
+# relative to it)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import gc
+import json
+import resource
+import time
+import tracemalloc
+import pygame
+from main import Game, Levels, World
+
+# Lives of the robot during the benchmark, so the game never ends. The scripted
+# inputs complete some levels, the level is started again then (without the
+# transition to the next level).
+lives = 1_000_000
+
+
+def script(tick: int, inputs: dict):
+    # Scripted inputs: runs to the right and back (turning around every 6
+    # seconds), sprints half of the time and jumps and double jumps regularly
+    inputs["to_right"] = tick % 720 < 360
+    inputs["to_left"] = not inputs["to_right"]
+    inputs["is_running"] = tick % 240 < 120
+    if tick % 50 == 0:
+        inputs["is_jumping"] = True
+    elif tick % 50 == 12 and inputs["is_jumping"]:
+        inputs["is_double_jumping"] = True
+
+
+def rate(step, count: int):
+    # Calls step(i) count times, returns the number of calls per second
+    start = time.perf_counter()
+    for i in range(count):
+        step(i)
+    return count / (time.perf_counter() - start)
+
+
+def allocations(step, count: int):
+    # Calls step(i) count times while tracing the memory allocations. Returns
+    # the mean and maximum of the memory allocated within a call (in bytes),
+    # and the number of generation 0 garbage collections.
+    collections = gc.get_stats()[0]["collections"]
+    peaks = []
+    tracemalloc.start()
+    for i in range(count):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(i)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return (
+        sum(peaks) / count,
+        max(peaks),
+        gc.get_stats()[0]["collections"] - collections,
+    )
+
+
+class BenchmarkGame(Game):
+    # The game without its main loop, the benchmark draws the frames itself
+    def main_loop(self):
+        pass
+
+    def start_level(self, level: int):
+        # Starts a new game at the level (without the start menu)
+        self.level = level
+        self.new_game()
+        self.inputs["game_started"] = True
+        self.world.lives = lives
+
+
+def benchmark_level(game: BenchmarkGame, level: int, ticks: int, frames: int):
+    # Simulation only
+    window_size = (game.window_width, game.window_height)
+    world = World(Levels.get(level, window_size), window_size, lives)
+    inputs = dict.fromkeys(
+        ["to_left", "to_right", "is_running", "is_jumping", "is_double_jumping"],
+        False,
+    )
+
+    def tick(i: int):
+        nonlocal world
+        script(i, inputs)
+        if world.step(inputs) == World.level_completed:
+            world = World(Levels.get(level, window_size), window_size, lives)
+
+    ticks_per_second = rate(tick, ticks)
+
+    # Simulation and rendering (a new game at this level, so the platforms
+    # are rendered as well)
+    game.start_level(level)
+
+    def frame(i: int):
+        pygame.event.pump()
+        script(i, game.inputs)
+        game.draw_window()
+        if game.level != level:
+            game.start_level(level)
+
+    frames_per_second = rate(frame, frames)
+    alloc_mean, alloc_max, collections = allocations(frame, frames)
+
+    return {
+        "game": "jumpbot",
+        "scenario": f"level-{level}",
+        "ticks": ticks,
+        "ticks_per_s": round(ticks_per_second, 1),
+        "frames": frames,
+        "fps": round(frames_per_second, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "alloc_bytes_per_frame_mean": round(alloc_mean),
+        "alloc_bytes_per_frame_max": alloc_max,
+        "gc_gen0_collections": collections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jumpbot benchmark")
+    parser.add_argument(
+        "--ticks", type=int, default=3000, help="simulation ticks per level"
+    )
+    parser.add_argument(
+        "--frames", type=int, default=600, help="rendered frames per level"
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="also write the results to FILE"
+    )
+    args = parser.parse_args()
+
+    game = BenchmarkGame()
+    # No frame rate limit, and one tick of the world per frame
+    game.fps = 0
+    game.step_clock.lockstep = True
+
+    results = []
+    try:
+        # Every level in the level file, including the test level
+        for level in range(Levels.count((game.window_width, game.window_height))):
+            result = benchmark_level(game, level, args.ticks, args.frames)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    finally:
+        # The game has no main loop that stops its worker thread
+        game.close()
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
 import pygame
 import math
-
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import csv
+import json
+import os
+import struct
+import threading
+import time
 
 # This is a game called (rather unoriginally) Jumpbot, in which you play a robot
 # that jumps around on platforms, collecting coins, avoiding monsters, and opening
@@ -15,20 +23,883 @@ import math
 # methods that no longer exist. :)
 
 
-class Robot:
-    def __init__(self, window: pygame.surface.Surface):
-        self.__robot = pygame.image.load("robot.png")
-        # Setting window and determining window sizes
+class ImageCache:
+    # Process-wide cache for the images of the game. Every image file is loaded
+    # from disk (and converted to the pixel format of the display) only once,
+    # after which all objects share the same image. Scaled images (the coin of
+    # the score display, the robots of the start menu) are cached as well, in a
+    # least recently used cache with a maximum size, since any size can be
+    # asked for. The fade animations of the coins and portals get a frame table
+    # each (see fade_frames()).
+    # N.B. the images are shared, so never draw on an image that comes out of
+    # the cache. Make a copy first.
+    # The next level is prepared on a worker thread (see Game.preload()), so
+    # the cache is guarded by a lock.
+    # Asteroids (part13-17_asteroids) has its own, smaller copy of this class,
+    # every exercise folder runs on its own.
+    max_variants = 256
+    __images = {}
+    __variants = OrderedDict()
+    __fade_frames = {}
+    __lock = threading.RLock()
+
+    @classmethod
+    def load(cls, file_name: str):
+        with cls.__lock:
+            image = cls.__images.get(file_name)
+            if image is None:
+                image = pygame.image.load(file_name)
+                # Converting the pixel format is only possible once the display
+                # has been set up. Without a display the image is used as loaded.
+                if pygame.display.get_surface() is not None:
+                    if image.get_flags() & pygame.SRCALPHA:
+                        image = image.convert_alpha()
+                    else:
+                        image = image.convert()
+                cls.__images[file_name] = image
+            return image
+
+    @classmethod
+    def scaled(cls, file_name: str, size: tuple, smooth: bool = False):
+        size = (int(size[0]), int(size[1]))
+        scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+        return cls.__variant(
+            ("scaled", file_name, size, smooth),
+            lambda: scale(cls.load(file_name), size),
+        )
+
+    @classmethod
+    def fade_frames(cls, file_name: str, lightness_values: tuple):
+        # Frame table of a fade animation: the image tinted with a grey of
+        # every lightness value (0-100) in the sequence, in that order. A table
+        # is rendered once per image and sequence, and shared by all objects
+        # that play the animation. Tables are not part of the LRU cache, there
+        # is only a fixed number of them.
+        key = (file_name, tuple(lightness_values))
+        with cls.__lock:
+            frames = cls.__fade_frames.get(key)
+            if frames is None:
+                color = pygame.Color(0)
+                table = []
+                for lightness in lightness_values:
+                    color.hsla = (1, 0, lightness, 100)
+                    table.append(cls.__tint(file_name, tuple(color)))
+                frames = tuple(table)
+                cls.__fade_frames[key] = frames
+            return frames
+
+    @classmethod
+    def __tint(cls, file_name: str, color: tuple):
+        # The image multiplied by a color (blend mode MULTIPLY)
+        image = cls.load(file_name).copy()
+        mask = pygame.Surface(image.get_size())
+        mask.fill(color)
+        image.blit(mask, (0, 0), special_flags=pygame.BLEND_MULT)
+        return image
+
+    @classmethod
+    def __variant(cls, key: tuple, create):
+        # Returns the cached variant for the key, or creates (and caches) it
+        # by calling create(). The least recently used variant is removed
+        # when the cache is full.
+        with cls.__lock:
+            image = cls.__variants.get(key)
+            if image is None:
+                image = create()
+                cls.__variants[key] = image
+                if len(cls.__variants) > cls.max_variants:
+                    cls.__variants.popitem(last=False)
+            else:
+                cls.__variants.move_to_end(key)
+            return image
+
+
+class TextCache:
+    # Process-wide cache for rendered texts. Rendering a text with a font is
+    # one of the most expensive calls in a frame, while almost all texts in the
+    # game (the menus, tutorials, coin count, lives and level) stay the same
+    # for many frames in a row. Rendered texts are kept in a least recently
+    # used cache, with the font, text, color and antialiasing as key. A text
+    # is therefore only rendered again when it changes (e.g. when a coin is
+    # collected).
+    # Asteroids (part13-17_asteroids) has its own, identical copy of this class.
+    max_texts = 256
+    __texts = OrderedDict()
+
+    @classmethod
+    def render(cls, font: pygame.font.Font, text: str, antialias: bool, color: tuple):
+        # Same arguments as font.render(), but the font itself comes first
+        key = (font, text, tuple(color), antialias)
+        rendered = cls.__texts.get(key)
+        if rendered is None:
+            rendered = font.render(text, antialias, color)
+            cls.__texts[key] = rendered
+            if len(cls.__texts) > cls.max_texts:
+                cls.__texts.popitem(last=False)
+        else:
+            cls.__texts.move_to_end(key)
+        return rendered
+
+
+class DirtyRectRenderer:
+    # Renders frames by only updating the parts of the window that have changed
+    # ("dirty rectangles"), instead of clearing and updating the whole window
+    # every frame. The background is the visible part of the level with its
+    # platforms (see Game.render_world()). The robot, monsters, coins, portal
+    # and HUD report the area they cover, either by drawing through
+    # self.blit() or by passing the rectangle to self.mark(). At the start of
+    # the next frame only these areas are restored from the background, and
+    # only the areas of the previous and the current frame are pushed to the
+    # display. When the camera scrolls, the whole background changes and is
+    # drawn again with self.redraw_background().
+    # When disabled, every frame is a full redraw of the background followed
+    # by pygame.display.flip() (fallback).
+    # Asteroids (part13-17_asteroids) has its own copy of this class, which
+    # never scrolls but can draw offscreen for replays.
+    def __init__(self, window: pygame.surface.Surface, enabled: bool = True):
         self.__window = window
-        self.__window_height = window.get_height()
-        self.__window_width = window.get_width()
+        self.__window_rect = window.get_rect()
+        self.__background = None
+        self.enabled = enabled
+        # Rectangles drawn in the previous and in the current frame
+        self.__previous_rects = []
+        self.__rects = []
+        # Whether the next frame has to start by restoring the whole background
+        self.__redraw = True
+        # Whether the current frame has to be pushed to the display in full
+        self.__full = True
+
+    @property
+    def full_redraw(self):
+        # True when the current frame covers the whole window
+        return self.__full or not self.enabled
+
+    def set_background(self, background: pygame.surface.Surface):
+        # Surface (the size of the window) that the frames are drawn on top of
+        self.__background = background
+        self.invalidate()
+
+    def redraw_background(self):
+        # Draws the whole background in the current frame (e.g. after it has
+        # been changed in place). The frame is pushed to the display in full,
+        # the next one only restores the areas drawn on top of it again.
+        self.__window.blit(self.__background, (0, 0))
+        self.__full = True
+
+    def invalidate(self):
+        # Call when something has been drawn over the whole window without
+        # reporting it (e.g. a menu or a flash). The current frame will be
+        # pushed to the display in full, and the next one starts with the
+        # whole background.
+        self.__redraw = True
+        self.__full = True
+
+    def begin_frame(self):
+        # Restores the background where things were drawn in the last frame
+        if self.__redraw or not self.enabled:
+            self.__window.blit(self.__background, (0, 0))
+            self.__redraw = False
+            self.__full = True
+        else:
+            for rect in self.__previous_rects:
+                self.__window.blit(self.__background, rect, rect)
+        self.__rects = []
+
+    def mark(self, rect: pygame.Rect):
+        # Reports an area of the window that has been drawn on in this frame
+        rect = self.__window_rect.clip(rect)
+        if rect.width > 0 and rect.height > 0:
+            self.__rects.append(rect)
+
+    def blit(self, image: pygame.surface.Surface, position: tuple):
+        # Draws an image on the window and reports the area it covers
+        rect = self.__window.blit(image, position)
+        self.mark(rect)
+        return rect
+
+    def present(self):
+        # Pushes the frame to the display
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.__previous_rects + self.__rects)
+        self.__previous_rects = self.__rects
+        self.__full = False
+
+
+class InputLog:
+    # Compact binary recording of the inputs of a game session, so the session
+    # can be simulated again exactly (e.g. to reproduce a bug, or to measure
+    # the speed of the simulation on the same workload). Only changes are
+    # stored: every record holds the tick at which the inputs changed and a
+    # bitmask of the values of the input keys (one bit per key in self.keys).
+    # The file starts with a header holding the seed of the random number
+    # generator and the total number of ticks recorded. Jumpbot has no random
+    # values, so the seed is always 0, and replay() runs the worlds only (the
+    # menus are not part of the log).
+    # Asteroids (part13-17_asteroids) has its own copy of this class, which
+    # logs the pause key as well.
+    magic = b"INPT"
+    keys = ("to_left", "to_right", "is_running", "is_jumping", "is_double_jumping")
+    __header = struct.Struct("<4sQI")
+    __record = struct.Struct("<IB")
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        # Total number of ticks recorded
+        self.ticks = 0
+        # List of (tick, bitmask) tuples
+        self.records = []
+        # Bitmask at the end of the previous tick (when recording), and the
+        # index of the next record to apply (when replaying)
+        self.__mask = None
+        self.__next = 0
+
+    @classmethod
+    def mask(cls, inputs: dict):
+        # Bitmask of the values of the input keys
+        mask = 0
+        for bit, key in enumerate(cls.keys):
+            if inputs[key]:
+                mask |= 1 << bit
+        return mask
+
+    @classmethod
+    def apply(cls, mask: int, inputs: dict):
+        # Sets the input keys to the values in the bitmask
+        for bit, key in enumerate(cls.keys):
+            inputs[key] = bool(mask >> bit & 1)
+
+    def record(self, tick: int, inputs: dict):
+        # Call before a tick is simulated. The inputs are only stored when they
+        # changed since the end of the previous tick (key presses, or the game
+        # resetting them).
+        mask = self.mask(inputs)
+        if mask != self.__mask:
+            self.records.append((tick, mask))
+
+    def end_tick(self, tick: int, inputs: dict):
+        # Call after a tick is simulated (the simulation changes some inputs
+        # itself, e.g. the jump inputs when the robot lands)
+        self.__mask = self.mask(inputs)
+        self.ticks = tick + 1
+
+    def replay(self, tick: int, inputs: dict):
+        # Sets the inputs recorded for this tick (if there are any)
+        while self.__next < len(self.records) and self.records[self.__next][0] <= tick:
+            self.apply(self.records[self.__next][1], inputs)
+            self.__next += 1
+
+    def finished(self, tick: int):
+        # True when all recorded ticks have been replayed
+        return tick >= self.ticks
+
+    def save(self, file_name: str):
+        with open(file_name, "wb") as f:
+            f.write(self.__header.pack(self.magic, self.seed, self.ticks))
+            for record in self.records:
+                f.write(self.__record.pack(*record))
+
+    @classmethod
+    def load(cls, file_name: str):
+        with open(file_name, "rb") as f:
+            data = f.read()
+        magic, seed, ticks = cls.__header.unpack_from(data)
+        if magic != cls.magic:
+            raise ValueError(f"{file_name} is not an input log")
+        log = cls(seed)
+        log.ticks = ticks
+        log.records = list(cls.__record.iter_unpack(data[cls.__header.size :]))
+        return log
+
+
+class FrameProfiler:
+    # Measures how long the different parts ("sections") of every frame take,
+    # using a monotonic nanosecond clock. The game calls self.begin_frame() at
+    # the start of a frame and self.lap(section) after every part of the
+    # frame, which adds the time since the previous lap to that section (a
+    # section can be lapped more than once per frame). The last frames are
+    # kept to calculate rolling percentiles of every section, which are shown
+    # in an overlay when self.visible is True. Optionally, the times of every
+    # frame (in nanoseconds) are written to a CSV or JSONL file, depending on
+    # the extension of the file name (e.g. to compare builds).
+    # In Jumpbot, "physics" is World.step(), "world" restores the background
+    # and draws the platforms (scrolled by Game.render_world()) and "entities"
+    # are the coins, portal, monsters and robot.
+    # Asteroids (part13-17_asteroids) has its own, identical copy of this class.
+    sections = ("input", "physics", "world", "entities", "hud", "present")
+    # Number of frames used for the percentiles
+    history = 600
+    # Number of frames between updates of the overlay
+    refresh = 30
+
+    def __init__(self, dump: str = None):
+        self.visible = False
+        # Number of frames measured
+        self.frames = 0
+        self.__history = {
+            section: deque(maxlen=self.history)
+            for section in self.sections + ("total",)
+        }
+        self.__times = dict.fromkeys(self.sections, 0)
+        self.__last = time.perf_counter_ns()
+        # Rendered lines of the overlay
+        self.__overlay = []
+        # File the frame times are written to
+        self.__dump = None
+        self.__csv = None
+        if dump is not None:
+            self.__dump = open(dump, "w", newline="")
+            if dump.endswith(".csv"):
+                self.__csv = csv.writer(self.__dump)
+                self.__csv.writerow(("frame",) + self.sections + ("total",))
+
+    def begin_frame(self):
+        for section in self.__times:
+            self.__times[section] = 0
+        self.__last = time.perf_counter_ns()
+
+    def lap(self, section: str):
+        # Adds the time since the previous lap to the section
+        now = time.perf_counter_ns()
+        self.__times[section] += now - self.__last
+        self.__last = now
+
+    def end_frame(self):
+        total = sum(self.__times.values())
+        for section, ns in self.__times.items():
+            self.__history[section].append(ns)
+        self.__history["total"].append(total)
+        if self.__csv is not None:
+            self.__csv.writerow(
+                (self.frames,) + tuple(self.__times.values()) + (total,)
+            )
+        elif self.__dump is not None:
+            self.__dump.write(
+                json.dumps({"frame": self.frames, **self.__times, "total": total})
+                + "\n"
+            )
+        self.frames += 1
+        # The overlay is rendered again every few frames (so it's readable and
+        # cheap to draw)
+        if self.frames % self.refresh == 0:
+            self.__overlay = []
+
+    def percentiles(self, section: str):
+        # The p50, p95 and p99 times of the section (in milliseconds) over the
+        # last frames
+        times = sorted(self.__history[section])
+        if not times:
+            return (0, 0, 0)
+        last = len(times) - 1
+        return tuple(times[int(last * p)] / 1_000_000 for p in (0.5, 0.95, 0.99))
+
+    def draw(
+        self, renderer: "DirtyRectRenderer", font: pygame.font.Font, topleft: tuple
+    ):
+        # Draws the overlay with the percentiles of every section
+        if not self.__overlay:
+            color = (255, 255, 0)
+            lines = ["Frame times (p50 / p95 / p99)"]
+            for section in self.sections + ("total",):
+                p50, p95, p99 = self.percentiles(section)
+                lines.append(f"{section}: {p50:.2f} / {p95:.2f} / {p99:.2f} ms")
+            self.__overlay = [
+                TextCache.render(font, line, True, color) for line in lines
+            ]
+        x, y = topleft
+        for line in self.__overlay:
+            renderer.blit(line, (x, y))
+            y += line.get_height()
+
+    def close(self):
+        if self.__dump is not None:
+            self.__dump.close()
+            self.__dump = None
+
+
+class FixedStepClock:
+    # Fixed timestep scheduler, decouples the simulation from the frame rate.
+    # Every frame, the real time that passed since the previous frame is added
+    # to an accumulator, and self.ticks() returns how many ticks of the
+    # simulation fit in it. Slow frames are caught up with by simulating more
+    # ticks (up to max_ticks per frame, after a longer stall the rest of the
+    # time is dropped), fast frames simulate no tick at all. The time left in
+    # the accumulator, as a fraction of a tick (self.alpha), is used to draw
+    # things in between their previous and current position (the robot, the
+    # monsters and the camera, at World.tick_rate ticks per second).
+    # In lockstep, every frame is exactly one tick (e.g. for benchmarks).
+    # Asteroids (part13-17_asteroids) has its own, identical copy of this class.
+    max_ticks = 5
+
+    def __init__(self, tick_rate: int):
+        self.__tick_time = 1_000_000_000 // tick_rate
+        self.lockstep = False
+        self.__accumulator = 0
+        self.__last = None
+
+    def reset(self):
+        # Forget the time that passed (e.g. after a pause or a menu), the next
+        # frame will be exactly one tick
+        self.__accumulator = 0
+        self.__last = None
+
+    def ticks(self):
+        # Number of ticks to simulate in this frame
+        if self.lockstep:
+            return 1
+        now = time.perf_counter_ns()
+        if self.__last is None:
+            self.__accumulator += self.__tick_time
+        else:
+            self.__accumulator += now - self.__last
+        self.__last = now
+        ticks = self.__accumulator // self.__tick_time
+        if ticks > self.max_ticks:
+            self.__accumulator = 0
+            return self.max_ticks
+        self.__accumulator -= ticks * self.__tick_time
+        return ticks
+
+    @property
+    def alpha(self):
+        # Fraction of a tick between the last simulated tick and now
+        if self.lockstep:
+            return 1
+        return self.__accumulator / self.__tick_time
+
+
+class PlatformHitboxes:
+    # Hitbox table of the platforms of one level. The platform map of a level
+    # (see Levels) is compiled into this table once per level, so the
+    # physics of the robot don't depend on the map data (or on the drawing of
+    # the world) anymore. The hitboxes are stored as (x, y, width, height)
+    # tuples.
+    # Collision detection only looks at the platforms near the robot, using a
+    # spatial index (a uniform grid, see PlatformIndex). The height of a grid
+    # row is equal to the distance between the "platform levels" of the map,
+    # meaning every platform level ends up in a row of its own. The rows are
+    # divided into buckets of a fixed width. Levels can be many windows wide,
+    # so the index is split into chunks of a few buckets wide, and the table
+    # contains a directory of the platforms in every chunk.
+    # The table is immutable, so it can be compiled on the worker thread of the
+    # game and shared by all worlds of the level (see Level). Everything that
+    # changes while playing (the chunks that are loaded) is kept by the index
+    # of every world.
+    row_height = 120
+    bucket_width = 128
+    chunk_buckets = 5
+    chunk_width = chunk_buckets * bucket_width
+
+    def __init__(self, platform_map: list, window_height: int):
+        # The platforms as (x, y, units) (see self.segments()), and their
+        # hitboxes in the same order
+        self.__segments = tuple(PlatformHitboxes.segments(platform_map, window_height))
+        hitboxes = []
+        for x, y, units in self.__segments:
+            hitboxes.append((x + 15, y + 15, units * 122, 35))
+        self.__hitboxes = tuple(hitboxes)
+        # Chunk directory: dict with chunk numbers as keys, and the indices of
+        # all platforms that (partly) lie in that chunk as values
+        directory = {}
+        for i in range(len(hitboxes)):
+            chunks = set()
+            for row, bucket in PlatformHitboxes.cells(pygame.Rect(hitboxes[i])):
+                chunks.add(bucket // PlatformHitboxes.chunk_buckets)
+            for chunk in chunks:
+                directory.setdefault(chunk, []).append(i)
+        self.__directory = {
+            chunk: tuple(indices) for chunk, indices in directory.items()
+        }
+
+    @staticmethod
+    def segments(platform_map: list, window_height: int):
+        # Generator that goes through the platform map and yields the topleft
+        # coordinates and the number of platform units of every platform, as
+        # (x, y, units). The structure of the map is discussed inside
+        # Levels.
+        for level in range(len(platform_map)):
+            # Always start outside of the map (x = -60), so the first platform
+            # can pass through the left border of the window.
+            x = -60
+            # The levels are separated by 120 pixels in height. The thickness
+            # of the platform is a little under 70 pixels (so the first level
+            # floats slightly above the bottom border of the window)
+            y = window_height - 70 - (level * 120)
+            # Loop through the elements of the levels
+            for i in range(len(platform_map[level])):
+                # Every even index counts the number of pixels between
+                # platforms
+                if i % 2 == 0:
+                    # Update the x coordinate with this number of pixels
+                    x += platform_map[level][i]
+                # Uneven index contains a number of adjacent platform units
+                else:
+                    yield (x, y, platform_map[level][i])
+                    # Update the x coordinate with the number of platform units
+                    # multiplied by platform width (120 pixels)
+                    x += platform_map[level][i] * 120
+
+    @staticmethod
+    def cells(rect: pygame.Rect):
+        # Grid cells covered by a rectangle. The right and bottom borders are
+        # included, so platforms that only touch the rectangle are found too.
+        rows = range(
+            rect.top // PlatformHitboxes.row_height,
+            rect.bottom // PlatformHitboxes.row_height + 1,
+        )
+        buckets = range(
+            rect.left // PlatformHitboxes.bucket_width,
+            rect.right // PlatformHitboxes.bucket_width + 1,
+        )
+        return [(row, bucket) for row in rows for bucket in buckets]
+
+    def chunk(self, chunk: int):
+        # Returns (index, rectangle) pairs of the platforms that (partly) lie
+        # in a chunk
+        return [
+            (i, pygame.Rect(self.__hitboxes[i]))
+            for i in self.__directory.get(chunk, ())
+        ]
+
+    def drawn(self, chunk: int):
+        # Returns the platforms (as (x, y, units), in the order of the map)
+        # that may be drawn in a chunk (see Game.render_chunk()). A platform is
+        # drawn a little wider than its hitbox, but by far less than a chunk,
+        # so the platforms in the chunks on either side are included as well.
+        indices = set()
+        for neighbour in range(chunk - 1, chunk + 2):
+            indices.update(self.__directory.get(neighbour, ()))
+        return [self.__segments[i] for i in sorted(indices)]
+
+    def grid(self, chunk: int):
+        # Builds the grid of a chunk: a dict with (row, bucket) keys, and
+        # (index, rectangle) pairs of all platforms that (partly) lie in that
+        # grid cell as values
+        grid = {}
+        buckets = range(
+            chunk * PlatformHitboxes.chunk_buckets,
+            (chunk + 1) * PlatformHitboxes.chunk_buckets,
+        )
+        for i, rect in self.chunk(chunk):
+            for row, bucket in PlatformHitboxes.cells(rect):
+                if bucket in buckets:
+                    grid.setdefault((row, bucket), []).append((i, rect))
+        return grid
+
+
+class PlatformIndex:
+    # Spatial index of the platforms of a level (see PlatformHitboxes), used by
+    # one world for collision detection. Every world has an index of its own,
+    # since the chunks it keeps loaded depend on its camera.
+    # Only the chunks around the camera are built (the rectangles and grid
+    # cells of their platforms), self.stream() builds the chunks the camera
+    # gets near and throws away the chunks that are far from it. The memory
+    # used by the index depends on the size of the window, not on the size of
+    # the level.
+    # Collisions are resolved with swept hitboxes (see self.sweep_x() and
+    # self.sweep_y()): instead of checking whether a hitbox ended up inside a
+    # platform after moving, the first platform it crossed on its way is looked
+    # up, so a hitbox can't pass through a platform, however fast it moves. At
+    # the speeds of the robot this gives the same results as checking the
+    # borders of the platforms that are inside the moved hitbox.
+    def __init__(self, hitboxes: PlatformHitboxes):
+        self.__hitboxes = hitboxes
+        # Grids of the loaded chunks (see PlatformHitboxes.grid()): dict with
+        # chunk numbers as keys, and the grid of the chunk as values
+        self.__chunks = {}
+        # Range of chunks kept by the last call of self.stream()
+        self.__streamed = None
+
+    def stream(self, left: float, right: float):
+        # Keeps the chunks between the x coordinates left and right loaded,
+        # plus one chunk on either side (so they are ready when the camera
+        # gets there). All other chunks are thrown away. This is the only
+        # place where chunks are built or thrown away.
+        first = math.floor(left / PlatformHitboxes.chunk_width) - 1
+        last = math.floor(right / PlatformHitboxes.chunk_width) + 1
+        if self.__streamed == (first, last):
+            return
+        self.__streamed = (first, last)
+        for chunk in list(self.__chunks):
+            if chunk < first or chunk > last:
+                del self.__chunks[chunk]
+        for chunk in range(first, last + 1):
+            if chunk not in self.__chunks:
+                self.__chunks[chunk] = self.__hitboxes.grid(chunk)
+
+    def near(self, rect: pygame.Rect):
+        # Returns the hitbox rectangles of the platforms near the rectangle (in
+        # the grid cells it covers). Only these platforms can collide with it.
+        # Rectangles are returned in the same order as the table itself. Chunks
+        # that aren't loaded are not built for this: all platforms of such a
+        # chunk are taken from the table instead (this only happens far from
+        # the camera, or before the first self.stream()).
+        found = {}
+        unloaded = set()
+        for row, bucket in PlatformHitboxes.cells(rect):
+            chunk = bucket // PlatformHitboxes.chunk_buckets
+            grid = self.__chunks.get(chunk)
+            if grid is not None:
+                for i, platform in grid.get((row, bucket), ()):
+                    found[i] = platform
+            elif chunk not in unloaded:
+                unloaded.add(chunk)
+                for i, platform in self.__hitboxes.chunk(chunk):
+                    found[i] = platform
+        return [found[i] for i in sorted(found)]
+
+    def sweep_x(self, rect: pygame.Rect, dx: float):
+        # The hitbox rect has just moved dx pixels horizontally. Looks up the
+        # first platform whose side it crossed on the way, i.e. a platform it
+        # didn't overlap before the move and does overlap after it (however
+        # far it moved, so it can't pass through a platform). Returns a tuple
+        # with the offset that moves the hitbox back against the side of that
+        # platform, and the contact normal: -1 when it hit the left side of a
+        # platform, 1 when it hit the right side, 0 when nothing is hit.
+        # Platforms that touch the top of the hitbox count as being at its
+        # height (this is how the borders of the platforms have always been
+        # tested, the corners are part of both borders).
+        offset = 0
+        normal = 0
+        if dx == 0:
+            return offset, normal
+        for platform in self.near(rect.inflate(2 * math.ceil(abs(dx)) + 2, 2)):
+            # Only platforms at the height of the hitbox can be hit
+            if platform.top >= rect.bottom or platform.bottom < rect.top:
+                continue
+            if dx > 0 and rect.right - dx <= platform.left < rect.right:
+                if platform.left - rect.right < offset:
+                    offset = platform.left - rect.right
+                    normal = -1
+            elif dx < 0 and rect.left < platform.right <= rect.left - dx:
+                if platform.right - rect.left > offset:
+                    offset = platform.right - rect.left
+                    normal = 1
+        return offset, normal
+
+    def sweep_y(self, rect: pygame.Rect, dy: int):
+        # The hitbox rect has just moved dy pixels vertically (down is
+        # positive). Looks up the first platform whose top or bottom it crossed
+        # on the way, the same way as self.sweep_x(). Returns a tuple with the
+        # offset that moves the hitbox back against that platform, the contact
+        # normal (-1 when it landed on top of a platform, 1 when it hit the
+        # bottom of a platform, 0 when nothing is hit) and whether the hitbox
+        # is grounded, i.e. stands on a platform after the offset. A hitbox
+        # that doesn't move is grounded when it touches the top of a platform.
+        # Platforms that touch the left side of the hitbox count as being
+        # below or above it.
+        offset = 0
+        normal = 0
+        touching = False
+        for platform in self.near(rect.inflate(2, 2 * abs(dy) + 2)):
+            # Only platforms below or above the hitbox can be hit
+            if platform.left >= rect.right or platform.right < rect.left:
+                continue
+            if platform.top == rect.bottom:
+                touching = True
+            if dy > 0 and rect.bottom - dy <= platform.top < rect.bottom:
+                if platform.top - rect.bottom < offset:
+                    offset = platform.top - rect.bottom
+                    normal = -1
+            elif dy < 0 and rect.top < platform.bottom <= rect.top - dy:
+                if platform.bottom - rect.top > offset:
+                    offset = platform.bottom - rect.top
+                    normal = 1
+        return offset, normal, normal == -1 or (normal == 0 and touching)
+
+
+class Level:
+    # A level compiled from the level file (see Levels). Everything that can
+    # be computed from the level data alone is computed once here, so starting
+    # a level (again) only has to create the objects that change while
+    # playing. A compiled level is immutable and shared by all worlds of the
+    # level: the hitboxes and rectangles are only meant to be read. Every world
+    # keeps its own index of the hitboxes (see PlatformIndex).
+    def __init__(self, number: int, data: dict, window_size: tuple):
+        self.number = number
+        # Width of the world (levels wider than the window scroll along with
+        # the robot, see Camera)
+        self.width = data.get("width", window_size[0])
+        # Platform map (rows of the structure discussed in Levels) as tuples
+        self.platforms = tuple(tuple(row) for row in data["platforms"])
+        # Hitboxes of the platforms, used by the robot for collision detection
+        self.hitboxes = PlatformHitboxes(self.platforms, window_size[1])
+        # Levels with the same platforms look the same, so the pre-rendered
+        # platform layer (see Game.render_world()) is cached by this key
+        self.render_key = (window_size, self.platforms)
+        # Coin positions and hitboxes
+        self.coins = tuple(tuple(position) for position in data["coins"])
+        coin_size = ImageCache.load("coin.png").get_size()
+        self.coin_rects = tuple(
+            pygame.Rect(position, coin_size) for position in self.coins
+        )
+        # Monster paths: ((x1, y1), (x2, y2), velocity)
+        self.monster_paths = tuple(
+            (tuple(start), tuple(end), velocity)
+            for start, end, velocity in data["monsters"]
+        )
+        # Portal position
+        self.portal = tuple(data["portal"])
+
+
+class Levels:
+    # Process-wide store of the levels, loaded from the level file. The file
+    # contains a list of levels, level 0 being a test level. Every level is a
+    # dictionary with the keys "platforms", "coins", "monsters" and "portal"
+    # (and "test": true for test levels). The optional key "width" is the
+    # width of the world in pixels, for levels wider than the window (the
+    # default is the width of the window).
+    # Every map has 5 "platform levels" (rows), separated by the same y-value
+    # (see PlatformHitboxes.segments()), at which tiles can be placed. The
+    # rows start at the lowest level. Lists are of variable size. They always
+    # start with the number of pixels preceding the first tile unit. If
+    # nothing follows, there are no tiles on this level. The next index is the
+    # number of tile units (as called in Game.draw_platform()). If nothing
+    # follows, the list contains no other values. Otherwise it has the
+    # structure: [pixels, build_units, pixels, build_units, ...]
+    # N.B. the lowest level always has [0, 1 or higher, ...] at the start,
+    # because of the robot spawn position!!!
+    # Coin lists contain the coordinates for coin spawns.
+    # Monster lists contain lists with two coordinates per monster
+    # (it patrols between these), along with its velocity:
+    # [..., [[x1, y1], [x2, y2], v], ...]
+    # Portal contains the portal coordinates (shows when coins are collected)
+    # The file is read and validated once. Levels are compiled (see Level)
+    # the first time they are needed, after which the compiled level is
+    # reused by every new game. Levels are also compiled on the worker thread
+    # of the game (see Game.preload()), so the store is guarded by a lock.
+    file_name = "levels.json"
+    rows = 5
+    # Highest a robot can get above the platform it stands on: the top of
+    # its hitbox after a jump (13 + 12 + ... + 1 pixels) and a double jump at
+    # the top of the jump (18 + 17 + ... + 1 pixels)
+    reach_height = 76 + 91 + 171
+    # Horizontal distance a robot can cover in the air during such a jump,
+    # i.e. going up to that height and falling back down to the platform
+    # (31 + 22 ticks at the maximum speed of 5 pixels per tick)
+    reach_width = (31 + 22) * 5
+    __data = None
+    __compiled = {}
+    __lock = threading.RLock()
+
+    @classmethod
+    def get(cls, level: int, window_size: tuple):
+        # Returns the compiled level
+        key = (level, tuple(window_size))
+        with cls.__lock:
+            compiled = cls.__compiled.get(key)
+            if compiled is None:
+                compiled = Level(level, cls.__load(window_size)[level], window_size)
+                cls.__compiled[key] = compiled
+            return compiled
+
+    @classmethod
+    def count(cls, window_size: tuple):
+        # Number of levels in the file (including the test level)
+        with cls.__lock:
+            return len(cls.__load(window_size))
+
+    @classmethod
+    def next_level(cls, level: int, window_size: tuple):
+        # Level that follows the level when it's completed. The last level
+        # is followed by the first one (the test level is never played).
+        return level + 1 if level < cls.count(window_size) - 1 else 1
+
+    @classmethod
+    def __load(cls, window_size: tuple):
+        if cls.__data is None:
+            with open(cls.file_name) as f:
+                data = json.load(f)
+            for level in range(len(data)):
+                cls.__validate(level, data[level], window_size)
+            cls.__data = data
+        return cls.__data
+
+    @classmethod
+    def __validate(cls, level: int, data: dict, window_size: tuple):
+        # Raises a ValueError when the level doesn't follow the rules above,
+        # or when a coin or the portal can't be reached from any platform
+        # (not checked for test levels)
+        def error(message: str):
+            return ValueError(f"{cls.file_name}, level {level}: {message}")
+
+        for key in ("platforms", "coins", "monsters", "portal"):
+            if key not in data:
+                raise error(f"'{key}' is missing")
+        width = data.get("width", window_size[0])
+        if not isinstance(width, int) or width < window_size[0]:
+            raise error("the width must be at least the width of the window")
+        platforms = data["platforms"]
+        if len(platforms) != cls.rows:
+            raise error(f"the map must have {cls.rows} rows")
+        for row in platforms:
+            if len(row) == 0 or any(not isinstance(value, int) for value in row):
+                raise error(f"invalid row {row}")
+            if any(units < 1 for units in row[1::2]):
+                raise error(f"row {row} has less than 1 platform unit")
+        if len(platforms[0]) < 2 or platforms[0][0] != 0:
+            raise error("the lowest row must start with [0, 1 or higher, ...]")
+        for path in data["monsters"]:
+            if len(path) != 3 or len(path[0]) != 2 or len(path[1]) != 2:
+                raise error(f"invalid monster path {path}")
+        if data.get("test", False):
+            return
+
+        hitboxes = PlatformHitboxes(platforms, window_size[1])
+        for position in data["coins"]:
+            rect = ImageCache.load("coin.png").get_rect(topleft=position)
+            if not cls.__reachable(hitboxes, rect):
+                raise error(f"coin at {tuple(position)} can't be reached")
+        rect = ImageCache.load("door.png").get_rect(topleft=data["portal"])
+        if not cls.__reachable(hitboxes, rect):
+            raise error(f"portal at {tuple(data['portal'])} can't be reached")
+
+    @classmethod
+    def __reachable(cls, hitboxes: PlatformHitboxes, rect: pygame.Rect):
+        # An object can be reached when it is within jumping distance of the
+        # top of a platform. Only the platforms in the chunks within jumping
+        # distance of the object need to be looked at.
+        chunks = range(
+            (rect.left - cls.reach_width) // PlatformHitboxes.chunk_width,
+            (rect.right + cls.reach_width) // PlatformHitboxes.chunk_width + 1,
+        )
+        for chunk in chunks:
+            for i, platform in hitboxes.chunk(chunk):
+                reach = pygame.Rect(
+                    platform.left - cls.reach_width,
+                    platform.top - cls.reach_height,
+                    platform.width + 2 * cls.reach_width,
+                    cls.reach_height,
+                )
+                if reach.colliderect(rect):
+                    return True
+        return False
+
+
+class Robot:
+    def __init__(self, world_size: tuple):
+        self.__robot = ImageCache.load("robot.png")
+        # Setting the size of the world (the width of the level and the height
+        # of the window). The robot doesn't need the window itself, it is drawn
+        # on the window passed to self.draw().
+        self.__world_width, self.__window_height = world_size
         # Setting initial coordinates and separately storing the initial y value
         self.__x = 0
         self.__y_initial = 579
         # self.__y = self.__y_initial
         self.__y = self.__y_initial
-        self.__x_previous = self.__x
-        self.__y_previous = self.__y
+        # Coordinates at the end of the previous tick (the robot is drawn in
+        # between these and the current coordinates)
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
+        # The hitbox (see get_hitbox()) is one rectangle that is moved in place
+        # when the robot has moved, together with the coordinates it was last
+        # moved to. It's shrunk by 6 pixels on the left and right, and by 10
+        # pixels at the top.
+        self.__hitbox = self.__robot.get_rect().inflate(-12, -10)
+        self.__hitbox_x = None
+        self.__hitbox_y = None
         # Setting hights for jumps and double jumps separately. Generally, having the
         # double jump value a little higher 'feels' better in this 'game'.
         self.__height_of_jump = 13
@@ -53,9 +924,12 @@ class Robot:
         self.__spawn_counter_max = 15  # Number of frames the spawning status lasts
         self.__spawn_counter = self.__spawn_counter_max
 
-    def play(self, inputs: dict, platform_data: list):
-        # Main method of the robot. Calls on the self.__move() method which
-        # calculates new coordinates and changes input values when necessary
+    def play(self, inputs: dict, platforms: "PlatformIndex"):
+        # Main method of the robot, advances it by one tick. Calls on the
+        # self.__move() method which calculates new coordinates and changes
+        # input values when necessary
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
         # Ignore inputs (i.e. don't __move()) when spawning until counter runs out
         if self.__spawning:
             if self.__spawn_counter == 0:
@@ -64,11 +938,18 @@ class Robot:
             else:
                 self.__spawn_counter -= 1
         else:
-            self.__move(inputs, platform_data)
-        # Draw the robot on the screen on the updated coordinates
-        self.__window.blit(self.__robot, (self.__x, self.__y))
-
-    def __move(self, inputs: dict, platform_data: list):
+            self.__move(inputs, platforms)
+
+    def draw(self, window: pygame.surface.Surface, alpha: float = 1, camera_x: int = 0):
+        # Draw the robot on the screen, return the area it covers. Alpha is the
+        # fraction of the way from the coordinates of the previous tick to the
+        # current coordinates (see FixedStepClock). Camera_x is the x
+        # coordinate of the world at the left border of the window.
+        x = self.__x_last_tick + (self.__x - self.__x_last_tick) * alpha
+        y = self.__y_last_tick + (self.__y - self.__y_last_tick) * alpha
+        return window.blit(self.__robot, (x - camera_x, y))
+
+    def __move(self, inputs: dict, platforms: "PlatformIndex"):
         # After bumping horizontally into a platform, the player loses
         # control of the robot in the horizontal plane for a brief moment.
         # This creates sense of recoil after bumping into a wall.
@@ -99,13 +980,11 @@ class Robot:
         self.__x += self.__x_velocity
 
         # Fall detection, checks if robot is in the air or walking on a platform
-        # Lower robot position by 1 pixel and check if clipping on the bottom takes place
         if not inputs["is_jumping"] and not self.__falling:
-            self.__y += 1
-            hit_offsets_for_fall_detection = self.__collision(platform_data)
-            # If the bottom offset is not equal to 1, this means the robot is not standing
-            # on a platform, but in fact in the air/falling
-            if abs(hit_offsets_for_fall_detection["bottom"]) != 1:
+            # A hitbox that doesn't move is grounded when it stands on a platform
+            # (see PlatformIndex.sweep_y())
+            grounded = platforms.sweep_y(self.get_hitbox(), 0)[2]
+            if not grounded:
                 # Falling is set to True
                 self.__falling = True
                 # Velocity is set to 0 instead of jump height
@@ -113,8 +992,6 @@ class Robot:
             else:
                 # If the robot is on a platform, the velocity stays equal to jump height
                 self.__y_velocity = self.__height_of_jump
-            # Decrease y position by 1 pixel again to return to pre-check position
-            self.__y -= 1
 
         if inputs["is_jumping"] or self.__falling:
             # Can use the double jump after falling off a ledge as well
@@ -123,33 +1000,29 @@ class Robot:
                 self.__y_velocity = self.__height_of_double_jump
             # Decrease y-coordinate by the velocity. Pre-jump on a platform velocity is positive,
             # (equal to 'jump height' variable), meaning the robot will go up the number of pixels
-            # in 'jump height' in 1 frame. If no hit is detected after changing the y-coordinate
-            # (checked by if and elif statements below), then the y-velocity for the next frame
-            # is decreased by the gravity value (standard -1), meaning the robot will move up 1
-            # less pixel in the next frame, and will eventually come down.
+            # in 'jump height' in 1 frame. If no hit is detected (the platforms the hitbox crossed
+            # on its way are looked up, see PlatformIndex.sweep_y()), then the y-velocity for
+            # the next frame is decreased by the gravity value (standard -1), meaning the robot
+            # will move up 1 less pixel in the next frame, and will eventually come down.
             # When a hit is detected with the head of the robot against a higher platform, the robot
             # falls down directly (velocity is set to 0 right away and becomes negative in the next
             # frame). When a hit is detected with the feet of the robot (i.e. landing), velocity is
             # set to jump height and jumping inputs are set to False (so the player can jump again).
             # self.__falling is also set to False after landing.
             self.__y -= self.__y_velocity
-            # Obtain collision offsets
-            hit_offsets = self.__collision(platform_data)
+            robot_hitbox = self.get_hitbox()
+            dy, normal_y = platforms.sweep_y(robot_hitbox, -self.__y_velocity)[:2]
+            # The sides of the platforms are tested at the height the robot moved
+            # to, before it is stopped by a platform above or below it (so jumping
+            # into the corner of a platform can both land the robot and bump it)
+            dx, normal_x = platforms.sweep_x(robot_hitbox, self.__x_velocity)
             # Situation when hitting a platform with the robot's top, i.e. from below.
-            if (
-                hit_offsets["top"] != 0
-                and self.__y_velocity >= 0
-                and (not self.__y_previous < self.__y + hit_offsets["top"])
-            ):
-                self.__y += hit_offsets["top"]
+            if normal_y == 1:
+                self.__y += dy
                 self.__y_velocity = 0
             # Situation when hitting a platform with the robot's bottom, i.e. from above / landing.
-            elif (
-                hit_offsets["bottom"] != 0
-                and self.__y_velocity <= 0
-                and (not self.__y_previous > self.__y + hit_offsets["bottom"])
-            ):
-                self.__y += hit_offsets["bottom"]
+            elif normal_y == -1:
+                self.__y += dy
                 self.__y_velocity = self.__height_of_jump
                 self.__double_jump_is_active = False
                 self.__falling = False
@@ -158,49 +1031,30 @@ class Robot:
             else:
                 self.__y_velocity -= self.__gravity
         else:
-            # If not jumping or falling, only obtain collision offsets for
-            # side collisions (see directly below)
-            hit_offsets = self.__collision(platform_data)
-
-        # Situation when hitting a platform with the robot's left side
-        if (
-            hit_offsets["left"] != 0
-            and self.__x_velocity < 0
-            and (not self.__x_previous < self.__x + hit_offsets["left"])
-        ):
-            # The hit offset is added to the x coordinate to prevent clipping
-            # In this case the offset will be a positive value, moving the robot
-            # to the right. This happens before the frame is generated, so it is
-            # not seen!
-            self.__x += hit_offsets["left"]
+            # If not jumping or falling, only look up the platforms the robot
+            # moved into sideways (see directly below)
+            dx, normal_x = platforms.sweep_x(self.get_hitbox(), self.__x_velocity)
+
+        # Situation when hitting a platform with the robot's side. The normal is
+        # -1 when hitting it with the robot's right side, and 1 with the left side.
+        # The offset is added to the x coordinate to prevent clipping. This
+        # happens before the frame is generated, so it is not seen!
+        if normal_x != 0:
+            self.__x += dx
             # Velocity is inverted for the bump animation
             self.__x_velocity = -self.__x_velocity
             # Increase the bump animation frames
             self.__x_bump = self.__x_bump_max
-        # Situation when hitting a platform with the robot's right side
-        if (
-            hit_offsets["right"] != 0
-            and self.__x_velocity > 0
-            and (not self.__x_previous > self.__x + hit_offsets["right"])
-        ):
-            # In this case the offset will be a negative value, moving the robot
-            # to the left.
-            self.__x += hit_offsets["right"]
-            self.__x_velocity = -self.__x_velocity
-            self.__x_bump = self.__x_bump_max
 
-        # Don't move beyond the horizontal borders of the window
+        # Don't move beyond the horizontal borders of the world
         if self.__x <= 0:
             self.__x = 0
-        elif self.__x >= self.__window_width - self.__robot.get_width():
-            self.__x = self.__window_width - self.__robot.get_width()
+        elif self.__x >= self.__world_width - self.__robot.get_width():
+            self.__x = self.__world_width - self.__robot.get_width()
         # Set previous horizontal velocity as current (previous velocity
         # is used to calculate the current velocity above in some cases,
         # e.g. in self.__deceleration())
         self.__previous_x_velocity = self.__x_velocity
-        # Set previous coordinates as current for next move() call
-        self.__x_previous = self.__x
-        self.__y_previous = self.__y
 
     def __base_movement_speed(self, to_left: bool, to_right: bool):
         # This method determines the base movement speed in the horizontal plane
@@ -259,50 +1113,19 @@ class Robot:
         return x_velocity
 
     def get_hitbox(self):
-        # Create a hitbox (rectangle object) on the position. This method is called upon
-        # by other objects in the game for hit detection.
-        robot_hitbox = self.__robot.get_rect(topleft=(self.__x, self.__y))
-        # Update hitbox size and position for hit detection that corresponds
-        # better with the robot.png image (there are some empty pixels in the image)
-        robot_hitbox = robot_hitbox.inflate(-12, -10).move(0, 5)
-        return robot_hitbox
-
-    def __collision(self, hitbox_data: list):
-        # Get robot hitbox
-        robot_hitbox = self.get_hitbox()
-        # Setting the y-offset to standard 0
-        # Dict with the 4 directions. If the value is 0, no hit has been detected.
-        # If a hit has been detected, the value is set to the offset in pixels.
-        hit_offsets = {"left": 0, "right": 0, "top": 0, "bottom": 0}
-
-        for platform in hitbox_data:
-            # Create rectangle object
-            platform_hitbox = pygame.Rect(platform)
-
-            # Save platform border variables, format (x1, y1, x2, y2)
-            # fmt: off
-            platform_left_border = (platform_hitbox.left, platform_hitbox.top, platform_hitbox.left, platform_hitbox.bottom)
-            platform_right_border = (platform_hitbox.right, platform_hitbox.top, platform_hitbox.right, platform_hitbox.bottom)
-            platform_top_border = (platform_hitbox.left, platform_hitbox.top, platform_hitbox.right, platform_hitbox.top)
-            platform_bottom_border = (platform_hitbox.left, platform_hitbox.bottom, platform_hitbox.right, platform_hitbox.bottom)
-            # fmt: on
-
-            # If the robot's left side is clipping the platform hitbox
-            if robot_hitbox.clipline(platform_right_border):
-                hit_offsets["left"] = platform_hitbox.right - robot_hitbox.left
-            # If the robot's right side is clipping the platform hitbox
-            if robot_hitbox.clipline(platform_left_border):
-                hit_offsets["right"] = platform_hitbox.left - robot_hitbox.right
-            # If the robot's top side is clipping the platform hitbox
-            if robot_hitbox.clipline(platform_bottom_border):
-                hit_offsets["top"] = platform_hitbox.bottom - robot_hitbox.top
-            # If the robot's bottom side is clipping the platform hitbox
-            if robot_hitbox.clipline(platform_top_border):
-                hit_offsets["bottom"] = platform_hitbox.top - robot_hitbox.bottom
-
-            # NOTE IF directionsleft == directions right, nothing happens in x direction!
-
-        return hit_offsets
+        # Return the hitbox (rectangle object) on the position. This method is called upon
+        # by other objects in the game for hit detection, many times per tick (for every
+        # coin and monster), so the same rectangle is returned every time and it's only
+        # moved when the robot has moved since the last call. The callers must not
+        # change it (use .move() or .copy() for a changed rectangle).
+        if self.__x != self.__hitbox_x or self.__y != self.__hitbox_y:
+            self.__hitbox_x = self.__x
+            self.__hitbox_y = self.__y
+            # The hitbox is smaller than the robot.png image for hit detection that
+            # corresponds better with it (there are some empty pixels in the image)
+            self.__hitbox.topleft = (self.__x, self.__y)
+            self.__hitbox.move_ip(6, 10)
+        return self.__hitbox
 
     def dead(self, hit_monster: bool):
         # Simple death condition: if robot falls below
@@ -316,8 +1139,8 @@ class Robot:
         # Reset robot to starting position after game over
         self.__x = 0
         self.__y = self.__y_initial
-        self.__x_previous = self.__x
-        self.__y_previous = self.__y
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
         self.__previous_x_velocity = 0
         self.__x_velocity = 0
         self.__y_velocity = self.__height_of_jump
@@ -328,78 +1151,116 @@ class Robot:
 
 
 class Coin:
-    def __init__(self, window: pygame.surface.Surface, coordinates: tuple):
+    # Lightness of the fade mask in every frame of the animation after the
+    # coin has been grabbed: from 100 down to 0 in steps of 2.5
+    fade_lightness = tuple(100 - 2.5 * i for i in range(41))
+
+    def __init__(self, coordinates: tuple):
         # Create coin image
-        self.__coin = pygame.image.load("coin.png")
-        # Setting window
-        self.__window = window
+        self.__coin = ImageCache.load("coin.png")
+        # Frames of the fade-out animation (shared by all coins)
+        self.__fade_frames = ImageCache.fade_frames("coin.png", Coin.fade_lightness)
         # Set coordinates
         self.__x = coordinates[0]
         self.__y = coordinates[1]
-        # Grabbed variable
-        self.__grabbed = False
         # Velocity of coin after being grabbed
         self.__y_velocity = 2
-        # Start color of coin overlay for animation
-        self.__color = pygame.Color(0)
-        self.__lightness = 100
-        self.__color.hsla = (1, 0, self.__lightness, 100)
+        # Current frame of the fade-out animation (-1 while not fading out)
+        self.__frame = -1
 
     @property
-    def grabbed(self):
-        return self.__grabbed
-
-    def __collision(self, robot: Robot):
-        robot_hitbox = robot.get_hitbox()
-        coin_hitbox = self.__coin.get_rect(topleft=(self.__x, self.__y))
-        if robot_hitbox.colliderect(coin_hitbox):
-            return True
-        return False
-
-    def __grabbed_animation(self):
-        # Creates animation for the coin after it has been grabbed by
-        # the player.
+    def finished(self):
+        # True when the animation after the coin has been grabbed is over:
+        # the coin has completely faded and moved out of the window
+        return self.__y <= -100 and self.__frame == len(self.__fade_frames) - 1
+
+    def animate(self):
+        # Advances the animation for the coin after it has been grabbed by
+        # the player: the coin moves up and fades out.
         if self.__y > -100:
             self.__y -= self.__y_velocity
-
-        # Set color and increase lightness for next frame
-        self.__color.hsla = (1, 0, self.__lightness, 100)
-        self.__lightness = self.__lightness - 2.5 if self.__lightness > 0 else 0
-        # Create fade mask rectangle and fill with color
-        fade_mask = pygame.Surface(self.__coin.get_size())
-        fade_mask.fill(self.__color)
-        # Display fade mask over coin image (with blend mode MULTIPLY)
-        coin = pygame.image.load("coin.png")
-        coin.blit(fade_mask, (0, 0), special_flags=pygame.BLEND_MULT)
-        # Display the resulting coin image
-        self.__window.blit(coin, (self.__x, self.__y))
-
-    def place(self, robot: Robot):
-        # Check if robot hitbox collides with coin hitbox
-        if not self.__grabbed:
-            self.__grabbed = self.__collision(robot)
-            # Display coin in the window
-            self.__window.blit(self.__coin, (self.__x, self.__y))
-        else:
-            # Get the fade-out animation rectangle
-            self.__grabbed_animation()
+        # Go to the next frame of the animation. The last frame (completely
+        # faded) is kept once it's reached.
+        if self.__frame < len(self.__fade_frames) - 1:
+            self.__frame += 1
+
+    def draw(self, window: pygame.surface.Surface, camera_x: int = 0):
+        # Display coin in the window (or the current frame of the fade-out
+        # animation), returns the area of the window the coin covers
+        position = (self.__x - camera_x, self.__y)
+        if self.__frame < 0:
+            return window.blit(self.__coin, position)
+        return window.blit(self.__fade_frames[self.__frame], position)
+
+
+class CoinGroup:
+    # All coins of a level. The hitboxes of the coins (precomputed by Level)
+    # that haven't been grabbed yet are kept in a list, so a tick only needs
+    # one collision check of the robot against all of them
+    # (Rect.collidelistall()). Grabbed coins are removed from the list, and
+    # counted as they are grabbed. Only the coins that are playing their
+    # animation after being grabbed are updated every tick.
+    def __init__(self, positions: tuple, hitboxes: tuple):
+        # All coins, in the order of the level, and the areas they are drawn
+        # in (the hitboxes of the coins are the size of the image)
+        self.__coins = [Coin(position) for position in positions]
+        self.__areas = tuple(hitboxes)
+        # Coins that can still be grabbed, and their hitboxes
+        self.__waiting = list(self.__coins)
+        self.__hitboxes = list(hitboxes)
+        # Coins that are playing their animation after being grabbed
+        self.__animating = []
+        # Number of coins in the level, and the number of coins grabbed
+        self.total = len(self.__coins)
+        self.grabbed = 0
+
+    def update(self, robot: Robot):
+        # Advances the animations of the coins grabbed in earlier ticks (and
+        # forgets the coins whose animation is over), then grabs the coins
+        # the robot collides with
+        for coin in self.__animating:
+            coin.animate()
+        if self.__animating:
+            self.__animating = [coin for coin in self.__animating if not coin.finished]
+        if self.__hitboxes:
+            hits = robot.get_hitbox().collidelistall(self.__hitboxes)
+            # Remove the coins from the back, so the indices stay valid
+            for i in reversed(hits):
+                self.__animating.append(self.__waiting.pop(i))
+                del self.__hitboxes[i]
+            self.grabbed += len(hits)
+
+    def draw(self, window: pygame.surface.Surface, camera_x: int = 0):
+        # Draws the coins in view (except the ones whose animation is over,
+        # the animation only moves a coin up), returns the areas of the window
+        # they cover
+        left = camera_x
+        right = camera_x + window.get_width()
+        rects = []
+        for coin, area in zip(self.__coins, self.__areas):
+            if area.right <= left or area.left >= right or coin.finished:
+                continue
+            rects.append(coin.draw(window, camera_x))
+        return rects
 
 
 class Portal:
-    def __init__(self, window: pygame.surface.Surface, coordinates: tuple):
+    # Lightness of the fade mask in every frame of the opening animation: from
+    # 0 up to 100 in steps of 1 (after which the portal image is shown as is)
+    fade_lightness = tuple(range(100))
+
+    def __init__(self, coordinates: tuple):
         # Create portal image
-        self.__portal = pygame.image.load("door.png")
-        # Setting window
-        self.__window = window
+        self.__portal = ImageCache.load("door.png")
+        # Frames of the fade-in animation
+        self.__fade_frames = ImageCache.fade_frames("door.png", Portal.fade_lightness)
         # Set coordinates
         self.__x = coordinates[0]
         self.__y = coordinates[1]
         # Bool that states whether or not robot entered portal
         self.__entered = False
-        # Start color of coin overlay for animation
-        self.__color = pygame.Color(0)
-        self.__lightness = 0
-        self.__color.hsla = (1, 0, self.__lightness, 100)
+        # Current frame of the opening animation (-1 before the portal opens)
+        self.__frame = -1
 
     @property
     def entered(self):
@@ -422,74 +1283,124 @@ class Portal:
             return True
         return False
 
-    def __open_animation(self):
-        # Set color and increase lightness for next frame
-        self.__color.hsla = (1, 0, self.__lightness, 100)
-        self.__lightness = self.__lightness + 1 if self.__lightness < 100 else 100
-        # Create fade mask rectangle and fill with color
-        fade_mask = pygame.Surface(self.__portal.get_size())
-        fade_mask.fill(self.__color)
-        # Display fade mask on the portal image with blend mode MULTIPLY
-        # Need to reload the portal image with every iteration. Using self.__portal
-        # every time would result in multiple overlaps with the mask.
-        portal = pygame.image.load("door.png")
-        portal.blit(fade_mask, (0, 0), special_flags=pygame.BLEND_MULT)
-        # Display resulting portal image
-        self.__window.blit(portal, (self.__x, self.__y))
-
-    def place(self, robot: Robot):
+    def update(self, robot: Robot):
+        # Advances the open portal by one tick.
         # If robot hasn't entered, self.__entered stays False. Once
         # robot has entered, it stays True
         if not self.__entered:
             self.__entered = self.__collision(robot)
-        # If animation hasn't terminated (lightness < 100), keep playing
-        # the fade-in animation
-        if self.__lightness < 100:
-            self.__open_animation()
+        # Go to the next frame of the fade-in animation, until it has
+        # terminated (no frames left)
+        if self.__frame < len(self.__fade_frames):
+            self.__frame += 1
+
+    def draw(self, window: pygame.surface.Surface, camera_x: int = 0):
+        # Returns the area of the window the portal covers
+        position = (self.__x - camera_x, self.__y)
+        # If animation hasn't terminated, display the current frame of the
+        # fade-in animation
+        if self.__frame < len(self.__fade_frames):
+            return window.blit(self.__fade_frames[self.__frame], position)
         # After it has terminated, simply display the portal
-        else:
-            self.__window.blit(self.__portal, (self.__x, self.__y))
-
-
-class Monster:
-    def __init__(self, window: pygame.surface.Surface, coords_and_velocity: list):
-        # Create monster image
-        self.__monster = self.__load_monster()
-        # Create window
-        self.__window = window
-        # Coordinates: start of path
-        self.__x1 = coords_and_velocity[0][0]
-        self.__y1 = coords_and_velocity[0][1]
-        # Coordinates: end of path
-        self.__x2 = coords_and_velocity[1][0]
-        self.__y2 = coords_and_velocity[1][1]
-        # Velocity
-        self.__velocity = coords_and_velocity[2]
-        # Initial coordinates set as floats
-        self.__x = float(self.__x1)
-        self.__y = float(self.__y1)
-        # Path length
-        self.__path_length = math.sqrt(
-            (self.__x2 - self.__x1) ** 2 + (self.__y2 - self.__y1) ** 2
-        )
-        # x and y velocity calculation
-        if self.__path_length > 0:
-            self.__x_velocity = (
-                (self.__x2 - self.__x1) * self.__velocity
-            ) / self.__path_length
-            self.__y_velocity = (
-                (self.__y2 - self.__y1) * self.__velocity
-            ) / self.__path_length
-        else:
-            self.__x_velocity = 0
-            self.__y_velocity = 0
+        return window.blit(self.__portal, position)
+
+
+class MonsterGroup:
+    # All monsters of a level, moved as a batch. Every monster patrols back
+    # and forth along a straight path, so its position is stored as a phase:
+    # the distance along the path (0 at the start, the path length at the
+    # end), which is advanced by the velocity of the monster every tick. The
+    # velocity changes sign at the ends of the path.
+    # The paths, steps and hitbox offsets are precomputed once, so a tick only
+    # updates a few numbers per monster, and the hitboxes (fixed-size
+    # rectangles, smaller than the image) are moved in place.
+    # The monster image (with an outline), its mirror image and the hitbox
+    # dimensions are the same for every monster. They are created once per
+    # process (see self.sprites()) and shared by all groups, so starting a
+    # level doesn't involve any image processing.
+    # Only the monsters whose path comes near the view are moved and drawn
+    # (see self.update()), the others catch up once they get near it.
+    hitbox_size = (38, 64)
+    # Distance from the view (in pixels) within which monsters are moved
+    view_margin = 120
+    __sprites = None
+
+    def __init__(self, paths: tuple):
+        # Monster image, its mirror image for monsters moving left, and the
+        # offset of a hitbox from the topleft corner of the image
+        self.__monster, self.__flipped, self.__hitbox_offset = MonsterGroup.sprites()
+        # Paths as (x1, y1, x direction, y direction, path length), where the
+        # direction is the unit vector from the start to the end of the path
+        self.__paths = []
+        # Phase along the path, and the step per tick (the velocity)
+        self.__phases = []
+        self.__steps = []
+        # Velocity at the start, the number of ticks after which the motion
+        # repeats itself (None when it's not known, see self.__rewind()) and
+        # the horizontal range (left, right) the monster is drawn in on its way
+        self.__velocities = []
+        self.__periods = []
+        self.__areas = []
+        # Number of ticks the group has been updated, and the tick at which
+        # every monster has moved last
+        self.__ticks = 0
+        self.__moved = []
+        # Coordinates now and at the end of the previous tick
+        self.__x = []
+        self.__y = []
+        self.__x_last_tick = []
+        self.__y_last_tick = []
+        self.__hitboxes = []
+        for (x1, y1), (x2, y2), velocity in paths:
+            path_length = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+            if path_length > 0:
+                direction = ((x2 - x1) / path_length, (y2 - y1) / path_length)
+            else:
+                # Monsters without a path don't move
+                direction = (0.0, 0.0)
+                velocity = 0
+            self.__paths.append((x1, y1, *direction, path_length))
+            self.__phases.append(0.0)
+            self.__steps.append(velocity)
+            self.__velocities.append(velocity)
+            if velocity == 0:
+                self.__periods.append(1)
+            elif float(velocity).is_integer():
+                self.__periods.append(2 * math.ceil(path_length / abs(velocity)))
+            else:
+                self.__periods.append(None)
+            self.__areas.append((min(x1, x2), max(x1, x2) + self.__monster.get_width()))
+            self.__moved.append(0)
+            self.__x.append(float(x1))
+            self.__y.append(float(y1))
+            self.__x_last_tick.append(float(x1))
+            self.__y_last_tick.append(float(y1))
+            self.__hitboxes.append(pygame.Rect((0, 0), MonsterGroup.hitbox_size))
+            self.__move_hitbox(len(self.__hitboxes) - 1)
+
+    @classmethod
+    def sprites(cls):
+        # Returns the shared (image, mirror image, hitbox offset) tuple,
+        # creates it the first time
+        if cls.__sprites is None:
+            monster = cls.__load_monster()
+            # The hitbox is centered on the image
+            width, height = monster.get_size()
+            hitbox_offset = (
+                width // 2 - cls.hitbox_size[0] // 2,
+                height // 2 - cls.hitbox_size[1] // 2,
+            )
+            flipped = pygame.transform.flip(monster, True, False)
+            cls.__sprites = (monster, flipped, hitbox_offset)
+        return cls.__sprites
 
-    def __load_monster(self):
+    @staticmethod
+    def __load_monster():
         # This method puts a white line around the monster so it is visible on a black
         # background
-        monster = pygame.image.load("monster.png")
-        # Load the image a second time
-        inverted_monster = pygame.image.load("monster.png")
+        monster = ImageCache.load("monster.png")
+        # Copy the image (the cached image itself shouldn't be drawn on)
+        inverted_monster = monster.copy()
         # Create white inversion mask the size of the monster image that's to be
         # inverted
         inversion_mask = pygame.Surface(inverted_monster.get_rect().size)
@@ -507,90 +1418,312 @@ class Monster:
 
         return inverted_monster
 
-    def __monster_image(self):
-        # This flips the monster horizontally depending on x-velocity
-        monster = self.__monster
-        if self.__x_velocity < 0:
-            monster = pygame.transform.flip(monster, True, False)
-        return monster
+    def __move_hitbox(self, i: int):
+        # Moves the hitbox of monster i to its current coordinates. The
+        # coordinates are rounded the same way as those of the image.
+        hitbox = self.__hitboxes[i]
+        hitbox.topleft = (self.__x[i], self.__y[i])
+        hitbox.move_ip(self.__hitbox_offset)
+
+    def update(self, left: float, right: float):
+        # Moves the monsters along their paths by one tick. Only the monsters
+        # that can get between the x coordinates left and right (the view,
+        # plus self.view_margin on either side) are moved. The others can't
+        # be seen and can't hit the robot, a monster that was left behind is
+        # put where it should be once it gets near the view again.
+        self.__ticks += 1
+        left -= MonsterGroup.view_margin
+        right += MonsterGroup.view_margin
+        for i in range(len(self.__paths)):
+            area_left, area_right = self.__areas[i]
+            if area_right < left or area_left > right:
+                continue
+            if self.__moved[i] < self.__ticks - 1:
+                self.__rewind(i, self.__ticks - 1)
+            self.__moved[i] = self.__ticks
+            self.__step(i)
+
+    def __step(self, i: int):
+        # Moves monster i along its path by one tick. A monster that would
+        # pass an end of its path stops at the end and turns around.
+        self.__x_last_tick[i] = self.__x[i]
+        self.__y_last_tick[i] = self.__y[i]
+        step = self.__steps[i]
+        if step == 0:
+            return
+        x1, y1, x_direction, y_direction, path_length = self.__paths[i]
+        phase = self.__phases[i] + step
+        if phase >= path_length:
+            phase = path_length
+            self.__steps[i] = -step
+        elif phase <= 0:
+            phase = 0
+            self.__steps[i] = -step
+        self.__phases[i] = phase
+        self.__x[i] = x1 + x_direction * phase
+        self.__y[i] = y1 + y_direction * phase
+        self.__move_hitbox(i)
+
+    def __rewind(self, i: int, ticks: int):
+        # Puts monster i where it is after the first ticks ticks of the level,
+        # by moving it from the start of its path again. With a whole-number
+        # velocity the phase goes from 0 to the end of the path and back in
+        # whole steps (from the first tick on), so the motion repeats itself
+        # exactly every period ticks, and at most one period is simulated.
+        self.__phases[i] = 0.0
+        self.__steps[i] = self.__velocities[i]
+        self.__x[i] = float(self.__paths[i][0])
+        self.__y[i] = float(self.__paths[i][1])
+        period = self.__periods[i]
+        if period is not None and ticks > period:
+            ticks = 1 + (ticks - 1) % period
+        for _ in range(ticks):
+            self.__step(i)
 
     def collision(self, robot: Robot):
-        # Get robot hitbox
-        robot_hitbox = robot.get_hitbox()
-        # Create portal rectangle overlapping portal image
-        monster_hitbox = self.__monster.get_rect(topleft=(self.__x, self.__y))
-        # Save center to variable
-        monster_center = monster_hitbox.center
-        # Resize hitbox (we want the player to get into the center of the portal
-        # in order to enter it) and set the center to the var saved above
-        monster_hitbox.width = 38
-        monster_hitbox.height = 64
-        monster_hitbox.center = monster_center
-        # Return True when robot collides, False if not
-        if robot_hitbox.colliderect(monster_hitbox):
-            return True
-        return False
-
-    def __get_next_coordinates(self):
-        # Get next x coordinate
-        if self.__x1 < self.__x2:
-            if (self.__x + self.__x_velocity) >= self.__x2:
-                self.__x = self.__x2
-                self.__x_velocity = -self.__x_velocity
-            elif (self.__x + self.__x_velocity) <= self.__x1:
-                self.__x = self.__x1
-                self.__x_velocity = -self.__x_velocity
-            else:
-                self.__x += self.__x_velocity
-        elif self.__x2 < self.__x1:
-            if (self.__x + self.__x_velocity) >= self.__x1:
-                self.__x = self.__x1
-                self.__x_velocity = -self.__x_velocity
-            elif (self.__x + self.__x_velocity) <= self.__x2:
-                self.__x = self.__x2
-                self.__x_velocity = -self.__x_velocity
-            else:
-                self.__x += self.__x_velocity
-        # Get next y coordinate
-        if self.__y1 < self.__y2:
-            if (self.__y + self.__y_velocity) >= self.__y2:
-                self.__y = self.__y2
-                self.__y_velocity = -self.__y_velocity
-            elif (self.__y + self.__y_velocity) <= self.__y1:
-                self.__y = self.__y1
-                self.__y_velocity = -self.__y_velocity
+        # Return True when the robot collides with any of the monsters
+        return robot.get_hitbox().collidelist(self.__hitboxes) != -1
+
+    def draw(self, window: pygame.surface.Surface, alpha: float = 1, camera_x: int = 0):
+        # Draws the monsters in view, returns the areas of the window they
+        # cover. The monsters are drawn in between their previous and current
+        # coordinates (see Robot.draw()), facing the direction they move in.
+        width = window.get_width()
+        rects = []
+        for i in range(len(self.__paths)):
+            x = self.__x_last_tick[i] + (self.__x[i] - self.__x_last_tick[i]) * alpha
+            # Coordinates need to be set to int because the coordinates will
+            # always be floats
+            x = int(x) - camera_x
+            if x >= width or x + self.__monster.get_width() <= 0:
+                continue
+            y = self.__y_last_tick[i] + (self.__y[i] - self.__y_last_tick[i]) * alpha
+            if self.__paths[i][2] * self.__steps[i] < 0:
+                monster = self.__flipped
             else:
-                self.__y += self.__y_velocity
-        elif self.__y2 < self.__y1:
-            if (self.__y + self.__y_velocity) >= self.__y1:
-                self.__y = self.__y1
-                self.__y_velocity = -self.__y_velocity
-            elif (self.__y + self.__y_velocity) <= self.__y2:
-                self.__y = self.__y2
-                self.__y_velocity = -self.__y_velocity
+                monster = self.__monster
+            rects.append(window.blit(monster, (x, int(y))))
+        return rects
+
+
+class Camera:
+    # Horizontal viewport on the world, for levels that are wider than the
+    # window. The camera keeps the robot in the middle of the window, but
+    # doesn't move beyond the borders of the world (so it never moves in a
+    # level that is as wide as the window). Like the robot, the camera moves
+    # once per tick and is drawn in between its previous and its current
+    # position (see FixedStepClock).
+    def __init__(self, view_width: int, world_width: int):
+        self.view_width = view_width
+        self.world_width = world_width
+        # x coordinate of the world at the left border of the window, now
+        # and at the end of the previous tick
+        self.__x = 0
+        self.__x_last_tick = 0
+
+    @property
+    def left(self):
+        return self.__x
+
+    @property
+    def right(self):
+        return self.__x + self.view_width
+
+    def follow(self, x: float, snap: bool = False):
+        # Moves the camera so that x is in the middle of the window (as far as
+        # the borders of the world allow). With snap the camera jumps there,
+        # instead of moving there during the next frame.
+        self.__x_last_tick = self.__x
+        self.__x = min(
+            max(x - self.view_width / 2, 0), self.world_width - self.view_width
+        )
+        if snap:
+            self.__x_last_tick = self.__x
+
+    def x(self, alpha: float = 1):
+        # Left border of the viewport in whole pixels, at the fraction alpha
+        # of the way from the previous position to the current one
+        return round(self.__x_last_tick + (self.__x - self.__x_last_tick) * alpha)
+
+
+class World:
+    # Simulation core of one level: the robot, coins, monsters and portal, and
+    # the platform hitboxes. The world is advanced one tick at a time by
+    # self.step(), using an input frame (the inputs dictionary of the game).
+    # Nothing in here draws anything or needs a display, so levels can be
+    # simulated as fast as possible (e.g. for bots, level validation or
+    # testing). Drawing the world is left to the game (see Game.draw_window()).
+    # Number of ticks per second (every tick moves everything by one step)
+    tick_rate = 60
+    # Outcomes of a tick, returned by self.step()
+    playing, life_lost, game_over, level_completed = 0, 1, 2, 3
+
+    def __init__(self, level: Level, window_size: tuple, lives: int):
+        # The compiled level (see Levels)
+        self.level = level
+        # Index of the platform hitboxes of the level, used by the robot for
+        # collision detection
+        self.platforms = PlatformIndex(level.hitboxes)
+        # Coin creation
+        self.coins = CoinGroup(level.coins, level.coin_rects)
+        # Monster creation
+        self.monsters = MonsterGroup(level.monster_paths)
+        # Portal creation
+        self.portal = Portal(level.portal)
+        # Create playable robot object.
+        self.robot = Robot((level.width, window_size[1]))
+        # Viewport of the world that is drawn in the window, the platforms
+        # around it are loaded (see self.step())
+        self.camera = Camera(window_size[0], level.width)
+        self.platforms.stream(self.camera.left, self.camera.right)
+        # Number of player lives
+        self.lives = lives
+        # Bool that indicates whether or not robot hit a monster in last tick
+        self.hit_monster = False
+        # Number of ticks simulated
+        self.ticks = 0
+
+    def next_level(self, outcome: int, window_size: tuple):
+        # Level to play after a game over (the first level, i.e. a new game)
+        # or after completing this level (see Levels.next_level())
+        if outcome == World.game_over:
+            return 1
+        return Levels.next_level(self.level.number, window_size)
+
+    @staticmethod
+    def starting_lives(level: int, previous=None):
+        # Number of lives to start the level with: 3 when it's the first level
+        # (a new game), else the lives left in the previous world
+        return 3 if level == 1 else previous.lives
+
+    @property
+    def coin_count(self):
+        # Number of coins grabbed in this level
+        return self.coins.grabbed
+
+    @property
+    def portal_open(self):
+        # Portal is open when all coins in the level have been grabbed
+        return self.coin_count == self.coins.total
+
+    def step(self, inputs: dict):
+        # Advances the world by one tick, returns the outcome of the tick
+        outcome = World.playing
+        self.ticks += 1
+
+        # Reset robot and inputs if a life is lost. If all lives are lost,
+        # it's game over and the tick ends here.
+        if self.robot.dead(self.hit_monster):
+            if self.lives > 0:
+                # Subtract one life
+                self.lives -= 1
+                # Reset hit_monster
+                self.hit_monster = False
+                # Reset robot and jump inputs
+                self.robot.reset()
+                inputs["is_jumping"] = False
+                inputs["is_double_jumping"] = False
+                outcome = World.life_lost
             else:
-                self.__y += self.__y_velocity
+                return World.game_over
 
-    def place(self):
-        # Coordinates need to be set to int because x- and y-velocities will
-        # always be floats
-        self.__window.blit(self.__monster_image(), (int(self.__x), int(self.__y)))
-        self.__get_next_coordinates()
+        # Update coins (robot is input to check for collision)
+        self.coins.update(self.robot)
+
+        # When the portal is open and the robot enters it, the robot gains a
+        # life and the level is completed
+        if self.portal_open:
+            self.portal.update(self.robot)
+            if self.portal.entered:
+                self.lives += 1
+                return World.level_completed
+
+        # Move the monsters that can be seen or can hit the robot (the robot
+        # may have jumped back to the start, away from the camera)
+        robot_hitbox = self.robot.get_hitbox()
+        self.monsters.update(
+            min(self.camera.left, robot_hitbox.left),
+            max(self.camera.right, robot_hitbox.right),
+        )
+        if self.monsters.collision(self.robot):
+            self.hit_monster = True
+
+        # Play the robot. Takes the game inputs and platform hitboxes as arguments.
+        self.robot.play(inputs, self.platforms)
+
+        # Move the camera along with the robot (it jumps back to the start
+        # with the robot after a life is lost), and only keep the platforms
+        # around the viewport loaded
+        self.camera.follow(
+            self.robot.get_hitbox().centerx, snap=outcome == World.life_lost
+        )
+        self.platforms.stream(self.camera.left, self.camera.right)
+
+        return outcome
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, record: str = None, profile: str = None):
         pygame.init()
 
+        # Input log (only when recording). The inputs of every world tick are
+        # saved to the file 'record' when the game is closed, and can be
+        # replayed with replay().
+        self.record_file = record
+        self.input_log = InputLog() if record is not None else None
+        # Number of world ticks simulated (over all levels and games)
+        self.ticks = 0
+        # The world is simulated at a fixed tick rate, independent of the
+        # frame rate (see FixedStepClock)
+        self.step_clock = FixedStepClock(World.tick_rate)
+        # Frame time profiler, its overlay is toggled with 'F3'. The frame
+        # times are written to the file 'profile' (if given).
+        self.profiler = FrameProfiler(profile)
+
         # Setting up the window
         self.window_height = 720
         self.window_width = 1280
         self.window = pygame.display.set_mode((self.window_width, self.window_height))
-
-        # Setting up a new game
+        # Create the monster images before the first level, so no level
+        # transition has to wait for them
+        MonsterGroup.sprites()
+        # Renderer that only updates the parts of the window that changed. Set
+        # enabled to False to redraw the whole window every frame instead.
+        self.renderer = DirtyRectRenderer(self.window, enabled=True)
+        # The platforms in view (see self.render_world()) and the background of
+        # the frames while playing: black, with the platforms. Both are the size
+        # of the window, they are created once and drawn again in place when
+        # the camera moves.
+        self.world_layer = pygame.Surface(
+            (self.window_width, self.window_height), pygame.SRCALPHA
+        ).convert_alpha()
+        self.background = pygame.Surface(
+            (self.window_width, self.window_height)
+        ).convert()
+
+        # Worker thread that prepares levels while the current level is played
+        # (see self.preload()): the next level, and the first level (where a
+        # game over leads to) once the robot is on its last life. Dict with the
+        # levels as keys and the futures holding the results as values.
+        self.preloader = ThreadPoolExecutor(max_workers=1)
+        self.preloaded = {}
+        # Remaining ticks of the transition to the next level, or back to the
+        # start menu (None when there is no transition)
+        self.transition = None
+
+        # Setting up a new game (there's no world of a previous level yet)
+        self.world = None
         self.level = 1
-        self.total_levels = 10
+        # Number of playable levels (the level file also has the test level)
+        self.total_levels = Levels.count((self.window_width, self.window_height)) - 1
         self.won = False  # win status
+        # Render key (see Level) of the platforms that are currently
+        # pre-rendered in self.chunk_layers (None means nothing has been
+        # rendered yet), and the camera position of self.world_layer
+        self.world_layer_key = None
+        self.world_layer_x = None
+        # Pre-rendered platforms of the chunks around the camera
+        self.chunk_layers = {}
         self.new_game()
 
         # Controls of the game
@@ -603,6 +1736,7 @@ class Game:
             "start": pygame.K_RETURN,
             "controls": pygame.K_c,
             "tutorials": pygame.K_t,
+            "profiler": pygame.K_F3,
         }
 
         # Control menu texts
@@ -617,9 +1751,10 @@ class Game:
             ["Press 'Esc' to return ...", ""],
         ]
 
-        # Clock
+        # Clock, the frame rate is limited to self.fps (the world itself runs
+        # at World.tick_rate)
         self.clock = pygame.time.Clock()
-        self.fps = 60
+        self.fps = 144
 
         # Setup of game fonts
         self.font1 = pygame.font.SysFont("Arial", 18)
@@ -660,36 +1795,38 @@ class Game:
         self.main_loop()
 
     def new_game(self):
-        # Getting the level dictionary
-        level = self.levels(self.level)
-
-        # Platform data stored in self.map
-        self.map = level["platforms"]
-
-        # Coin data stored in self.coins
-        self.coins = [Coin(self.window, position) for position in level["coins"]]
-
-        # Monster creation
-        self.monsters = [
-            Monster(self.window, position) for position in level["monsters"]
-        ]
-
-        # Bool that indicates whether or not robot hit a monster in last frame
-        self.hit_monster = False
-
-        # Portal creation
-        self.portal = Portal(self.window, level["portal"])
-
-        # Number of player lives is equal to 3 when starting a new
-        # game (i.e. self.level == 1), but doesn't change
-        # when not starting a new game (i.e. self.level > 1)
-        self.lives = 3 if self.level == 1 else self.lives
-
-        # Create playable robot object.
-        self.robot = Robot(self.window)
+        # Getting the compiled level (only compiled the first time it's played)
+        level = Levels.get(self.level, (self.window_width, self.window_height))
+
+        # Number of player lives is equal to 3 when starting a new game, but
+        # doesn't change when not starting a new game (see World.starting_lives())
+        lives = World.starting_lives(self.level, self.world)
+
+        # Create the simulation of the level (robot, coins, monsters, portal
+        # and platform hitboxes)
+        self.world = World(level, (self.window_width, self.window_height), lives)
+
+        # Pre-render the platforms of the level (if the level changed). Uses
+        # the platforms the worker thread has rendered, if it prepared this
+        # level.
+        self.take_preloaded()
+        self.render_world()
+        self.renderer.set_background(self.background)
+        self.transition = None
+        # Prepare the next level in the background. Other prepared levels are
+        # dropped, except for the first level (see self.draw_window()).
+        next_level = Levels.next_level(
+            self.level, (self.window_width, self.window_height)
+        )
+        for level in list(self.preloaded):
+            if level != next_level and level != 1:
+                self.preloaded.pop(level).cancel()
+        self.start_preload(next_level)
 
         # Pause status of the game
         self.paused = False
+        # Don't catch up with the time spent before the new game
+        self.step_clock.reset()
 
         # Game inputs. Set to false at the start of every game.
         self.inputs = {
@@ -706,203 +1843,24 @@ class Game:
             else self.inputs["show_tutorials"],
         }
 
-    def levels(self, level: int):
-        # The levels list contains a dictionary of levels
-        # Every map has 5 "platform levels", separated by the same y-value
-        # (in self.build_world()),
-        # at which tiles can be placed. The map consists of a dictionary,
-        # where each level is represented as a key, starting at the
-        # lowest level. Lists are of variable size. They always start with
-        # the number of pixels preceding the first tile unit. If nothin follows,
-        # there are no tiles on this level. The next index is the number of tile
-        # units (as called in self.building_unit()). If nothing follows, the
-        # list contains no other values. Otherwise it has the structure:
-        # [pixels, build_units, pixels, build_units, ...]
-        # N.B. make sure the lowet level always has [0, 1 or higher, ...] at the
-        # start, because of the robot spawn position!!!
-
-        # Coin lists contain the coordinates for coin spawns.
-        # Monster lists contain lists with two coordinates per monster
-        # (it patrols between these), along with its velocity:
-        # [..., [(x1, y1), (x2, y2), v], ...]
-        # Portal contains the portal coordinates (shows when coins are collected)
-
-        levels = [
-            # TEST LEVEL 0
-            {
-                "platforms": [[0, 3, 200, 3], [0], [0], [0], [0]],
-                "coins": [(500, 500), (120, 600), (800, 450)],
-                "monsters": [[(0, 0), (0, 0), 0]],
-                "portal": (600, 100),
-            },
-            # LEVEL 1
-            {
-                "platforms": [[0, 12], [0], [0], [0], [0]],
-                "coins": [(500, 600), (120, 600), (800, 500)],
-                "monsters": [],
-                "portal": (1150, 575),
-            },
-            # LEVEL 2
-            {
-                "platforms": [[0, 12], [0], [300, 3], [0], [0]],
-                "coins": [(450, 200), (120, 600), (1100, 450)],
-                "monsters": [],
-                "portal": (500, 320),
-            },
-            # LEVEL 3
-            {
-                "platforms": [
-                    [0, 1, 150, 2, 300, 2],
-                    [1200, 1],
-                    [0],
-                    [820, 3],
-                    [500, 1],
-                ],
-                "coins": [(900, 600), (1224, 400), (850, 100)],
-                "monsters": [],
-                "portal": (520, 100),
-            },
-            # LEVEL 4
-            {
-                "platforms": [
-                    [0, 2, 250, 9],
-                    [0],
-                    [700, 3],
-                    [500, 1],
-                    [0],
-                ],
-                "coins": [(900, 600), (320, 400), (500, 200)],
-                "monsters": [[(600, 600), (1200, 600), 2], [(700, 300), (700, 100), 1]],
-                "portal": (300, 650),
-            },
-            # LEVEL 5
-            {
-                "platforms": [
-                    [0, 5, 150, 5],
-                    [120, 1, 880, 1],
-                    [250, 3, 150, 3],
-                    [0, 1, 150, 7, 150, 1],
-                    [0],
-                ],
-                "coins": [(100, 300), (380, 360), (890, 360), (1120, 480)],
-                "monsters": [
-                    [(250, 360), (1000, 360), 2],
-                    [(110, 460), (110, 100), 2],
-                    [(1110, 100), (1110, 460), 2],
-                ],
-                "portal": (630, 220),
-            },
-            # LEVEL 6
-            {
-                "platforms": [
-                    [0, 1, 250, 1, 700, 2],
-                    [130, 2, 140, 2],
-                    [380, 1, 260, 1],
-                    [520, 2, 250, 1],
-                    [0, 4, 700, 2],
-                ],
-                "coins": [(20, 130), (250, 240), (900, 10), (1200, 600), (570, 420)],
-                "monsters": [
-                    [(0, 120), (400, 120), 3],
-                    [(250, 600), (1000, 100), 2],
-                    [(1000, 600), (240, 240), 2],
-                ],
-                "portal": (950, 600),
-            },
-            # LEVEL 7
-            {
-                "platforms": [
-                    [0, 1, 150, 1, 600, 1],
-                    [180, 1, 400, 1],
-                    [0, 1, 1000, 2],
-                    [800, 3],
-                    [180, 1, 850, 2],
-                ],
-                "coins": [(550, 250), (990, 590), (1200, 50), (180, 50)],
-                "monsters": [
-                    [(750, 230), (1100, 230), 1],
-                    [(0, 25), (1220, 25), 6],
-                    [(350, 350), (550, 650), 2],
-                ],
-                "portal": (270, 580),
-            },
-            # LEVEL 8
-            {
-                "platforms": [
-                    [0, 1, 250, 1, 250, 1, 250, 1],
-                    [1270, 1],
-                    [374, 1, 250, 1, 250, 1],
-                    [150, 1],
-                    [374, 1, 250, 1, 250, 1],
-                ],
-                "coins": [
-                    (375, 600),
-                    (740, 600),
-                    (1110, 600),
-                    (375, 360),
-                    (740, 360),
-                    (1110, 360),
-                    (375, 120),
-                    (740, 120),
-                    (155, 240),
-                ],
-                "monsters": [
-                    [(730, 0), (730, 650), 3],
-                    [(730, 0), (80, 650), 3],
-                    [(730, 0), (1110, 650), 3],
-                ],
-                "portal": (1110, 100),
-            },
-            # LEVEL 9
-            {
-                "platforms": [
-                    [0, 1, 300, 4],
-                    [0],
-                    [620, 1],
-                    [400, 1, 340, 1],
-                    [0, 1, 1120, 1],
-                ],
-                "coins": [(10, 100), (1230, 100), (400, 220), (860, 220)],
-                "monsters": [
-                    [(0, 340), (540, 340), 8],
-                    [(540, 340), (0, 340), 8],
-                    [(200, 0), (200, 650), 8],
-                    [(1240, 340), (700, 340), 8],
-                    [(700, 340), (1240, 340), 8],
-                    [(1050, 650), (1050, 0), 8],
-                ],
-                "portal": (600, 580),
-            },
-            # LEVEL 10
-            {
-                "platforms": [
-                    [0, 5, 530, 1],
-                    [-60, 5],
-                    [124, 4, 670, 1],
-                    [-60, 5],
-                    [124, 4, 300, 1, 250, 1],
-                ],
-                "coins": [(520, 600), (130, 360), (1240, 360), (910, 120)],
-                "monsters": [
-                    [(300, 600), (1200, 600), 3],
-                    [(0, 480), (900, 480), 2],
-                    [(60, 360), (1200, 360), 4],
-                    [(900, 240), (0, 240), 2],
-                    [(1200, 120), (60, 120), 4],
-                ],
-                "portal": (800, 550),
-            },
-        ]
-
-        return levels[level]
-
     def main_loop(self):
         # Main game loop. Check for events (mainly keyboard inputs)
         # and draw the frames in the window in reaction to the inputs
-        # Keeps looping until the game is closed.
-        while True:
-            self.check_events()
-            self.draw_window()
+        # Keeps looping until the game is closed (see self.close()).
+        try:
+            while True:
+                self.profiler.begin_frame()
+                self.check_events()
+                self.profiler.lap("input")
+                self.draw_window()
+        finally:
+            self.close()
+
+    def close(self):
+        # Stops the worker thread, without waiting for the level it may be
+        # preparing. Called when the main loop ends, or by whoever draws the
+        # frames instead of the main loop (e.g. the benchmark).
+        self.preloader.shutdown(wait=False, cancel_futures=True)
 
     def check_events(self):
         for event in pygame.event.get():
@@ -953,6 +1911,9 @@ class Game:
                         self.inputs["show_tutorials"] = False
                     else:
                         self.inputs["show_tutorials"] = True
+                # Key press to toggle the frame time overlay
+                if event.key == self.controls["profiler"]:
+                    self.profiler.visible = not self.profiler.visible
 
             if event.type == pygame.KEYUP:
                 if event.key == self.controls["move_left"]:
@@ -963,7 +1924,20 @@ class Game:
                     self.inputs["is_running"] = False
 
             if event.type == pygame.QUIT:
-                exit()
+                self.quit()
+
+    def quit(self):
+        # Saves the input log (when recording) and closes the game
+        if self.input_log is not None:
+            self.input_log.save(self.record_file)
+        self.profiler.close()
+        exit()
+
+    def end_tick(self):
+        # Ends a tick of the world
+        if self.input_log is not None:
+            self.input_log.end_tick(self.ticks, self.inputs)
+        self.ticks += 1
 
     def start_menu(self):
         # Color of text
@@ -975,11 +1949,13 @@ class Game:
         line1 = "Press 'Enter' to start a new game."
         line2 = "Press 'c' to view game controls."
         # Render texts
-        title = self.menu_title_font.render(self.game_title, True, title_color)
-        go = self.menu_title_font.render("GAME OVER!", True, game_over_color)
-        won = self.menu_title_font.render("YOU WON!!!", True, won_color)
-        text1 = self.menu_text_font.render(line1, True, text_color)
-        text2 = self.menu_text_font.render(line2, True, text_color)
+        title = TextCache.render(
+            self.menu_title_font, self.game_title, True, title_color
+        )
+        go = TextCache.render(self.menu_title_font, "GAME OVER!", True, game_over_color)
+        won = TextCache.render(self.menu_title_font, "YOU WON!!!", True, won_color)
+        text1 = TextCache.render(self.menu_text_font, line1, True, text_color)
+        text2 = TextCache.render(self.menu_text_font, line2, True, text_color)
         # Display texts
         self.window.blit(title, (self.x_txt, 100))
         if self.game_over:
@@ -990,9 +1966,9 @@ class Game:
         self.window.blit(text2, (self.x_txt, 250))
         self.basic_instructions(y_offset=330)
         # Get robot image to display large next on start menu page
-        robot_image = pygame.image.load("robot.png")
-        robot_image = pygame.transform.scale(
-            robot_image, (robot_image.get_width() * 5, robot_image.get_height() * 5)
+        robot_image = ImageCache.load("robot.png")
+        robot_image = ImageCache.scaled(
+            "robot.png", (robot_image.get_width() * 5, robot_image.get_height() * 5)
         )
         self.window.blit(robot_image, (100, 100))
 
@@ -1001,8 +1977,8 @@ class Game:
         # List of text renders
         text_renders = [
             [
-                self.menu_text_font.render(line[0], True, text_color),
-                self.menu_text_font.render(line[1], True, text_color),
+                TextCache.render(self.menu_text_font, line[0], True, text_color),
+                TextCache.render(self.menu_text_font, line[1], True, text_color),
             ]
             for line in self.controls_menu_texts
         ]
@@ -1019,7 +1995,7 @@ class Game:
         text_color = (150, 150, 150)
         # List of text renders
         text_renders = [
-            self.font2.render(self.tutorial_texts[i], True, text_color)
+            TextCache.render(self.font2, self.tutorial_texts[i], True, text_color)
             for i in range(5)
         ]
         # Display texts
@@ -1031,8 +2007,9 @@ class Game:
             increment = 40 if i == 0 else 30
             y_offset += increment
 
-    def draw_block(self, block: str, topleft: tuple):
-        # Draws the different building blocks used to create the level.
+    def draw_block(self, surface: pygame.surface.Surface, block: str, topleft: tuple):
+        # Draws the different building blocks used to create the level onto
+        # the given surface.
         # Imported x and y offsets
         x, y = topleft
 
@@ -1068,13 +2045,15 @@ class Game:
         # fmt: on
 
         if blocks[block][0] == "r":
-            pygame.draw.rect(self.window, blocks[block][1], blocks[block][2])
-            pygame.draw.rect(self.window, outline_color, blocks[block][2], width=1)
+            pygame.draw.rect(surface, blocks[block][1], blocks[block][2])
+            pygame.draw.rect(surface, outline_color, blocks[block][2], width=1)
         else:
-            pygame.draw.polygon(self.window, blocks[block][1], blocks[block][2])
-            pygame.draw.polygon(self.window, outline_color, blocks[block][2], width=1)
+            pygame.draw.polygon(surface, blocks[block][1], blocks[block][2])
+            pygame.draw.polygon(surface, outline_color, blocks[block][2], width=1)
 
-    def draw_platform(self, length: int, topleft: tuple):
+    def draw_platform(
+        self, surface: pygame.surface.Surface, length: int, topleft: tuple
+    ):
         # Draws an entire platform calling on self.draw_block() in the
         # correct order, with correct input coordinates.
         # Set starting x and y topleft coordinates, as input from map data
@@ -1087,123 +2066,212 @@ class Game:
             # fmt: off
             # Draw the starting unit of the platform
             if i == 0:
-                self.draw_block("tile_surface", (x_start - 1 + unit_length, y_start))
-                self.draw_block("tile_front", (x_start + unit_length, y_start + 31))
-                self.draw_block("half_brick", (x_start + unit_length, y_start + 35))
+                self.draw_block(surface, "tile_surface", (x_start - 1 + unit_length, y_start))
+                self.draw_block(surface, "tile_front", (x_start + unit_length, y_start + 31))
+                self.draw_block(surface, "half_brick", (x_start + unit_length, y_start + 35))
                 for j in range(3):
-                    self.draw_block("full_brick", (x_start + 15 + (30 * j) + unit_length, y_start + 35))
+                    self.draw_block(surface, "full_brick", (x_start + 15 + (30 * j) + unit_length, y_start + 35))
                 for j in range(4):
-                    self.draw_block("full_brick", (x_start + (30 * j) + unit_length, y_start + 49))
+                    self.draw_block(surface, "full_brick", (x_start + (30 * j) + unit_length, y_start + 49))
             # Draw middle units of the platform
             else:
-                self.draw_block("tile_surface", (x_start - 1 + unit_length, y_start))
-                self.draw_block("tile_front", (x_start + unit_length, y_start + 31))
+                self.draw_block(surface, "tile_surface", (x_start - 1 + unit_length, y_start))
+                self.draw_block(surface, "tile_front", (x_start + unit_length, y_start + 31))
                 for j in range(-1, 3):
-                    self.draw_block("full_brick", (x_start + 15 + (30 * j) + unit_length, y_start + 35))
+                    self.draw_block(surface, "full_brick", (x_start + 15 + (30 * j) + unit_length, y_start + 35))
                 for j in range(4):
-                    self.draw_block("full_brick", (x_start + (30 * j) + unit_length, y_start + 49))
+                    self.draw_block(surface, "full_brick", (x_start + (30 * j) + unit_length, y_start + 49))
             # If i is at the end of the length range, draw the end of the platform
             if i == length - 1:
-                self.draw_block("tile_side", (x_start + 120 + unit_length, y_start))
-                self.draw_block("half_brick", (x_start + 105 + unit_length, y_start + 35))
-                self.draw_block("brick_side", (x_start + 120 + unit_length, y_start + 19))
-                self.draw_block("brick_side", (x_start + 136 + unit_length, y_start + 3))
-                self.draw_block("brick_half_side", (x_start + 120 + unit_length, y_start + 41))
-                self.draw_block("brick_side", (x_start + 128 + unit_length, y_start + 25))
-                self.draw_block("brick_half_side", (x_start + 144 + unit_length, y_start + 17))
-                self.draw_block("side_visual_fix", (x_start + 151 + unit_length, y_start))
+                self.draw_block(surface, "tile_side", (x_start + 120 + unit_length, y_start))
+                self.draw_block(surface, "half_brick", (x_start + 105 + unit_length, y_start + 35))
+                self.draw_block(surface, "brick_side", (x_start + 120 + unit_length, y_start + 19))
+                self.draw_block(surface, "brick_side", (x_start + 136 + unit_length, y_start + 3))
+                self.draw_block(surface, "brick_half_side", (x_start + 120 + unit_length, y_start + 41))
+                self.draw_block(surface, "brick_side", (x_start + 128 + unit_length, y_start + 25))
+                self.draw_block(surface, "brick_half_side", (x_start + 144 + unit_length, y_start + 17))
+                self.draw_block(surface, "side_visual_fix", (x_start + 151 + unit_length, y_start))
             # fmt: on
 
-    def build_world(self):
-        # This method creates the game world. Map data is stored in self.map.
-        # This data is used to draw platforms with (using method
-        # self.draw_platform()). Meanwhile, it defines the hitboxes of all
-        # platforms, using the map data (from which we can derive the number
-        # of platforms created at a certain x,y-coordinate)
-
-        # List that contains dimensional info needed to create hitboxes of the
-        # platforms in the world. The info is saved as [x, y, width, height].
-        # This data will get returned, so it can be accessed by the player-
-        # controlled robot to check for collision with the platforms.
-        hitbox_data = []
-
-        # Construct the level from the information contained in self.map
-        # Loops through all 'level's inside map, the structure of which
-        # is discussed inside method self.new_game().
-        for level in range(len(self.map)):
-            # Always start outside of the map (x = -60), so the first platform
-            # can pass through the left border of the window.
-            x = -60
-            # The levels are separated by 120 pixels in height. The thickness
-            # of the platform is a little under 70 pixels (so the first level
-            # floats slightly above the bottom border of the window)
-            y = self.window_height - 70 - (level * 120)
-            # Loop through the elements of the levels
-            for i in range(len(self.map[level])):
-                # Every even index counts the number of pixels between
-                # platforms
-                if i % 2 == 0:
-                    # Update the x coordinate with this number of pixels
-                    x += self.map[level][i]
-                # Uneven index contains a number of adjacent platform units
-                else:
-                    # Save hitbox dimensions in a tuple, which is then appended to
-                    # the hitbox data list
-                    hitbox_dimensions = (x + 15, y + 15, self.map[level][i] * 122, 35)
-                    hitbox_data.append(hitbox_dimensions)
-                    # Draw the platform. The argument self.map[level][i] will input
-                    # the number of adjacent platform units into self.draw_platform()
-                    self.draw_platform(self.map[level][i], (x, y))
-                    # Update the x coordinate with the number of platform units
-                    # multiplied by platform width (120 pixels)
-                    x += self.map[level][i] * 120
-
-        return hitbox_data
+    def render_world(self):
+        # The platforms never change within a level, so instead of drawing
+        # every block each frame, they are pre-rendered into offscreen
+        # surfaces. Levels can be much wider than the window, so the level is
+        # split into chunks (PlatformHitboxes.chunk_width wide). A chunk is
+        # rendered once the camera gets near it, and thrown away when the
+        # camera has moved away from it (see self.chunk_layer()). The chunks
+        # in view are combined into self.world_layer, which is all that
+        # self.draw_window() has to blit. The layers have per-pixel alpha, so
+        # whatever is drawn behind the platforms (coins, the portal) stays
+        # visible in the gaps.
+        # The combined layer only changes when the camera moves, the chunks
+        # are only thrown away when the platforms change. Returns True when
+        # the layer (and the background) changed, they are drawn again in place.
+        render_key = self.world.level.render_key
+        if self.world_layer_key != render_key:
+            self.chunk_layers = {}
+            self.world_layer_key = render_key
+            self.world_layer_x = None
+        camera_x = self.world.camera.x(self.step_clock.alpha)
+        if self.world_layer_x == camera_x:
+            return False
+        self.world_layer_x = camera_x
+
+        # Chunks in view, and one chunk on either side (within the world)
+        chunk_width = PlatformHitboxes.chunk_width
+        first = camera_x // chunk_width
+        last = (camera_x + self.window_width - 1) // chunk_width
+        ahead = range(
+            max(first - 1, 0),
+            min(last + 1, (self.world.level.width - 1) // chunk_width) + 1,
+        )
+        for chunk in list(self.chunk_layers):
+            if chunk not in ahead:
+                del self.chunk_layers[chunk]
+        for chunk in ahead:
+            self.chunk_layer(chunk)
+
+        self.world_layer.fill((0, 0, 0, 0))
+        for chunk in range(first, last + 1):
+            self.world_layer.blit(
+                self.chunk_layers[chunk], (chunk * chunk_width - camera_x, 0)
+            )
+        self.background.fill((0, 0, 0))
+        self.background.blit(self.world_layer, (0, 0))
+        return True
+
+    def chunk_layer(self, chunk: int):
+        # Returns the pre-rendered platforms of a chunk, renders them if they
+        # aren't cached
+        layer = self.chunk_layers.get(chunk)
+        if layer is None:
+            layer = self.render_chunk(self.world.level.hitboxes, chunk)
+            layer = layer.convert_alpha()
+            self.chunk_layers[chunk] = layer
+        return layer
+
+    def render_chunk(self, hitboxes: PlatformHitboxes, chunk: int):
+        # Renders the platforms of a chunk on a new surface. Only the platforms
+        # around the chunk are looked at (see PlatformHitboxes.drawn()), so the
+        # cost doesn't depend on the width of the level. Only draws on that
+        # surface, so it can run on the worker thread as well.
+        layer = pygame.Surface(
+            (PlatformHitboxes.chunk_width, self.window_height), pygame.SRCALPHA
+        )
+        self.build_world(
+            layer, hitboxes.drawn(chunk), chunk * PlatformHitboxes.chunk_width
+        )
+        return layer
+
+    def preload(self, level: int):
+        # Runs on the worker thread: compiles the level (see Levels) and
+        # renders the platforms of the chunks around the start of the level
+        # (where the camera starts). Returns the render key of the level and
+        # the rendered chunks. The images of the coins, the portal and the
+        # monsters are shared by all levels, so they are ready already.
+        compiled = Levels.get(level, (self.window_width, self.window_height))
+        chunk_width = PlatformHitboxes.chunk_width
+        last = min(
+            (self.window_width - 1) // chunk_width + 1,
+            (compiled.width - 1) // chunk_width,
+        )
+        layers = {}
+        for chunk in range(last + 1):
+            layers[chunk] = self.render_chunk(compiled.hitboxes, chunk)
+        return compiled.render_key, layers
+
+    def start_preload(self, level: int):
+        # Starts preparing a level on the worker thread (unless it is being
+        # prepared already)
+        if level not in self.preloaded:
+            self.preloaded[level] = self.preloader.submit(self.preload, level)
+
+    def take_preloaded(self):
+        # Takes over the platforms the worker thread rendered, when it
+        # prepared the current level. Only the chunks that aren't rendered
+        # already are taken over (the platforms may be in use already, e.g.
+        # after a game over in the first level). Only waits for the worker
+        # thread if it isn't done yet.
+        preloaded = self.preloaded.pop(self.level, None)
+        if preloaded is None:
+            return
+        render_key, layers = preloaded.result()
+        if self.world_layer_key != render_key:
+            self.chunk_layers = {}
+            self.world_layer_key = render_key
+            self.world_layer_x = None
+        for chunk, layer in layers.items():
+            if chunk not in self.chunk_layers:
+                # Converting the pixel format is done here, on the main thread
+                self.chunk_layers[chunk] = layer.convert_alpha()
+
+    def build_world(
+        self, surface: pygame.surface.Surface, platforms: list, left: int = 0
+    ):
+        # This method creates the part of the game world from the x coordinate
+        # left onwards on the given surface (see self.render_world()), from
+        # the platforms of a level as (x, y, units) (see
+        # PlatformHitboxes.segments()).
+        # These are drawn with method self.draw_platform(). The hitboxes of
+        # the platforms are compiled separately by PlatformHitboxes (see Level).
+        right = left + surface.get_width()
+        for x, y, units in platforms:
+            # A platform is drawn from 1 pixel left of x up to 32 pixels right
+            # of its last unit, skip it when that's outside the surface
+            if x - 1 >= right or x + units * 120 + 32 < left:
+                continue
+            # Draw the platform. The argument units will input the number
+            # of adjacent platform units into self.draw_platform()
+            self.draw_platform(surface, units, (x - left, y))
 
     def display_score(self, coin_count: int):
         # Color of the text
         number_color = (255, 255, 255)
         # Coin image, which is then made smaller
-        coin_image = pygame.image.load("coin.png")
-        small_coin = pygame.transform.smoothscale(
-            coin_image, (coin_image.get_width() * 0.5, coin_image.get_height() * 0.5)
+        coin_image = ImageCache.load("coin.png")
+        small_coin = ImageCache.scaled(
+            "coin.png",
+            (coin_image.get_width() * 0.5, coin_image.get_height() * 0.5),
+            smooth=True,
         )
         # Text: shows amount of collected coins / total collectable coins
         # (for the current level)
-        score_text = self.font1.render(
-            f"{coin_count}/{len(self.coins)}", True, number_color
+        score_text = TextCache.render(
+            self.font1, f"{coin_count}/{self.world.coins.total}", True, number_color
         )
         # Display the number of coins that have been collected
         # next to a small coin icon.
-        self.window.blit(score_text, (45, 45))
-        self.window.blit(small_coin, (20, 45))
+        self.renderer.blit(score_text, (45, 45))
+        self.renderer.blit(small_coin, (20, 45))
 
     def display_lives(self):
         # Color of text
         lives_color = (255, 0, 0)
         # Text
-        lives_text = self.font1.render(f"{self.lives}", True, lives_color)
-        heart = self.font2.render("♥", True, lives_color)
+        lives_text = TextCache.render(
+            self.font1, f"{self.world.lives}", True, lives_color
+        )
+        heart = TextCache.render(self.font2, "♥", True, lives_color)
         # Display the text
-        self.window.blit(heart, (24, 13))
-        self.window.blit(lives_text, (45, 18))
+        self.renderer.blit(heart, (24, 13))
+        self.renderer.blit(lives_text, (45, 18))
 
     def display_level(self):
         # Color of text
         text_color = (255, 255, 255)
         # Text
-        level = self.font1.render(
-            f"Level {self.level}/{self.total_levels}", True, text_color
+        level = TextCache.render(
+            self.font1, f"Level {self.level}/{self.total_levels}", True, text_color
         )
         # Display
-        self.window.blit(level, (24, 70))
+        self.renderer.blit(level, (24, 70))
 
     def display_tutorials(self, coin_count: int):
         # Tutorial text color
         color = (255, 255, 255)
         # Render tutorial texts
         renders = [
-            self.font1.render(self.tutorial_texts[i], True, color)
+            TextCache.render(self.font1, self.tutorial_texts[i], True, color)
             for i in range(5, len(self.tutorial_texts))
         ]
         # Get rectangles so tutorial texts can be horizontally centered
@@ -1216,17 +2284,17 @@ class Game:
         # Display according to level
         if self.level == 1:
             if coin_count < 2:
-                self.window.blit(renders[0], renders_rect[0])
+                self.renderer.blit(renders[0], renders_rect[0])
             elif coin_count == 2:
-                self.window.blit(renders[1], renders_rect[1])
+                self.renderer.blit(renders[1], renders_rect[1])
             else:
-                self.window.blit(renders[2], renders_rect[2])
+                self.renderer.blit(renders[2], renders_rect[2])
         elif self.level == 2:
-            self.window.blit(renders[3], renders_rect[3])
+            self.renderer.blit(renders[3], renders_rect[3])
         elif self.level == 3:
-            self.window.blit(renders[4], renders_rect[4])
+            self.renderer.blit(renders[4], renders_rect[4])
         elif self.level == 4:
-            self.window.blit(renders[5], renders_rect[5])
+            self.renderer.blit(renders[5], renders_rect[5])
 
     def pause_menu(self):
         # Colors of text
@@ -1234,7 +2302,7 @@ class Game:
         # Main pause text
         pause_text = "Game paused. Press 'Esc' to continue ..."
         # Render texts
-        pause = self.menu_text_font.render(pause_text, True, text_color)
+        pause = TextCache.render(self.menu_text_font, pause_text, True, text_color)
         # Display texts
         self.window.blit(pause, (self.x_txt, 250))
         self.basic_instructions(y_offset=330)
@@ -1252,11 +2320,10 @@ class Game:
             return not self.paused
 
     def draw_window(self):
-        # Set black background color
-        self.window.fill((0, 0, 0))
-
         # Display start menu when new game starts or game is over
         if not self.inputs["game_started"]:
+            # Menus are drawn on a black window
+            self.window.fill((0, 0, 0))
             if self.inputs["show_controls"]:
                 self.controls_menu()
                 if self.inputs["pause_status_change"]:
@@ -1265,7 +2332,9 @@ class Game:
             else:
                 self.start_menu()
 
-            pygame.display.flip()
+            self.renderer.invalidate()
+            self.renderer.present()
+            self.step_clock.reset()
             self.clock.tick(self.fps)
             return
 
@@ -1277,6 +2346,7 @@ class Game:
 
         # Check pause status, display pause menu if True
         if self.paused:
+            self.window.fill((0, 0, 0))
             # Show controls menu if 'c' is pressed during the pause,
             # else show pause menu
             if self.inputs["show_controls"]:
@@ -1288,91 +2358,152 @@ class Game:
                     self.inputs["show_controls"] = False
             else:
                 self.pause_menu()
-            pygame.display.flip()
+            self.renderer.invalidate()
+            self.renderer.present()
+            self.step_clock.reset()
             self.clock.tick(self.fps)
             return
 
-        # Set game over condition to True if conditions are met
-        dead = self.robot.dead(self.hit_monster)
+        # Transition to the next level (or back to the start menu): the last
+        # frame stays in the window for half a second, and then the next level
+        # (which the worker thread has prepared in the meantime) is started.
+        # The transition is timed in ticks, so the game loop keeps running
+        # (and handling events) during the transition.
+        if self.transition is not None:
+            self.transition -= self.step_clock.ticks()
+            if self.transition > 0:
+                self.clock.tick(self.fps)
+                return
+            self.new_game()
+
+        # Restore the background (black, with the platforms) where things
+        # have been drawn in the previous frame
+        self.renderer.begin_frame()
+        self.profiler.lap("world")
+
+        # Advance the world by the number of ticks that fit in the time since
+        # the previous frame. A tick in which more happens than just movement
+        # (a life lost, game over or level completed) ends the stepping for
+        # this frame.
+        outcome = World.playing
+        for _ in range(self.step_clock.ticks()):
+            if self.input_log is not None:
+                self.input_log.record(self.ticks, self.inputs)
+            outcome = self.world.step(self.inputs)
+            if outcome != World.playing:
+                break
+            self.end_tick()
+
+        if outcome == World.life_lost:
+            # Window flashes slightly red for 1 frame to inform
+            # the player a life has been lost
+            self.window.fill((100, 0, 0))
+            self.renderer.invalidate()
+            # On the last life, the next life lost is game over, which starts
+            # the first level again: prepare it in the background
+            if self.world.lives == 0:
+                self.start_preload(1)
+        elif outcome == World.game_over:
+            # If out of lives, game over, start new game after the transition
+            # (this will return to start menu because level is set to 1)
+            self.level = self.world.next_level(
+                outcome, (self.window_width, self.window_height)
+            )
+            # Set game over status to True
+            self.game_over = True
+            self.transition = World.tick_rate // 2
+        elif outcome == World.level_completed:
+            # If self.level = self.total_levels, self.level is reset to 1, meaning
+            # new_game will set parameters such that the start menu will appear.
+            # Also, self.won is set to True when self.level is equal to 1 (the order
+            # of operations ensures this only happens when the level has been equal
+            # to total levels, i.e. the highest level). This will allow the appropriate
+            # text in the start menu to be displayed.
+            self.level = self.world.next_level(
+                outcome, (self.window_width, self.window_height)
+            )
+            self.won = True if self.level == 1 else False
+            self.transition = World.tick_rate // 2
+
+        # End of the last tick
+        if outcome != World.playing:
+            self.end_tick()
+        self.profiler.lap("physics")
+        # The frame in which the transition starts isn't shown, the last
+        # frame of the level stays in the window
+        if self.transition is not None:
+            self.clock.tick(self.fps)
+            return
 
-        # Reset robot and inputs if a life is lost. Reset the game if all
-        # lives are lost (this will return to start menu because level is
-        # set to 1).
-        if dead:
-            if self.lives > 0:
-                # Window flashes slightly red for 1 frame to inform
-                # the player a life has been lost
-                self.window.fill((100, 0, 0))
-                # Subtract one life
-                self.lives -= 1
-                # Reset hit_monster
-                self.hit_monster = False
-                # Reset robot and jump inputs
-                self.robot.reset()
-                self.inputs["is_jumping"] = False
-                self.inputs["is_double_jumping"] = False
-                # self.inputs["move_left"] = False
-                # self.inputs["move_right"] = False
-            else:
-                # If out of lives, game over, start new game
-                self.level = 1
-                pygame.time.wait(500)
-                # Set game over status to True
-                self.game_over = True
-                self.new_game()
-
-        # Place coins (robot is input to check for collision)
-        for coin in self.coins:
-            coin.place(self.robot)
-
-        # Portal is open when sum of grabbed coins is equal to the amount of
-        # coins within the level.
-        # Get the coin count of the current level
-        level_coin_count = sum([coin.grabbed for coin in self.coins])
-        open_portal = True if level_coin_count == len(self.coins) else False
+        # Everything is drawn relative to the camera. When the camera has
+        # moved, the platforms move along and the whole window is redrawn.
+        camera_x = self.world.camera.x(self.step_clock.alpha)
+        if self.render_world():
+            self.renderer.redraw_background()
+        self.profiler.lap("world")
 
-        if open_portal:
-            self.portal.place(self.robot)
-            if self.portal.entered:
-                self.lives += 1
-                # If self.level = self.total_levels, self.level is reset to 1, meaning
-                # new_game will set parameters such that the start menu will appear.
-                # Also, self.won is set to True when self.level is equal to 1 (the order
-                # of operations ensures this only happens when the level has been equal
-                # to total levels, i.e. the highest level). This will allow the appropriate
-                # text in the start menu to be displayed.
-                self.level = self.level + 1 if self.level < self.total_levels else 1
-                self.won = True if self.level == 1 else False
-                pygame.time.wait(500)
-                self.new_game()
-
-        # Get hitbox data. It should be noted that self.build_world() doesn't
-        # only return this data, but also has the side effect of drawing the
-        # platforms inside the window. This is done to avoid having to loop
-        # through the map data twice.
-        hitbox_data = self.build_world()
+        # Areas of the things that are drawn behind the platforms
+        behind_platforms = []
+
+        # Draw coins
+        behind_platforms.extend(self.world.coins.draw(self.window, camera_x))
+
+        # Get the coin count of the current level
+        level_coin_count = self.world.coin_count
+
+        # Draw the portal when it is open
+        if self.world.portal_open:
+            behind_platforms.append(self.world.portal.draw(self.window, camera_x))
+        self.profiler.lap("entities")
+
+        # Display the platforms, which have been pre-rendered for this level
+        # (and camera position) by self.render_world(). They are part of the background, so they
+        # only have to be drawn again over the coins and the portal (unless
+        # the whole window is redrawn).
+        if self.renderer.full_redraw:
+            self.window.blit(self.world_layer, (0, 0))
+        else:
+            for rect in behind_platforms:
+                self.window.blit(self.world_layer, rect, rect)
+        for rect in behind_platforms:
+            self.renderer.mark(rect)
 
         # If self.display_hitboxes == True, a red box will be displayed around
         # the hitboxes of the platforms. This is for testing purposes
         if self.display_hitboxes:
-            for hitbox in hitbox_data:
-                pygame.draw.rect(self.window, (255, 0, 0), hitbox, width=2)
-                pygame.draw.rect(
-                    self.window, (255, 0, 0), self.robot.get_hitbox(), width=2
+            view = pygame.Rect(camera_x, 0, self.window_width, self.window_height)
+            for hitbox in self.world.platforms.near(view):
+                self.renderer.mark(
+                    pygame.draw.rect(
+                        self.window, (255, 0, 0), hitbox.move(-camera_x, 0), width=2
+                    )
+                )
+                self.renderer.mark(
+                    pygame.draw.rect(
+                        self.window,
+                        (255, 0, 0),
+                        self.world.robot.get_hitbox().move(-camera_x, 0),
+                        width=2,
+                    )
                 )
+        self.profiler.lap("world")
 
         # Display tutorials if they are toggled
         if self.inputs["show_tutorials"] and self.level < 5:
             self.display_tutorials(level_coin_count)
+        self.profiler.lap("hud")
 
-        # Create monsters
-        for monster in self.monsters:
-            monster.place()
-            if monster.collision(self.robot):
-                self.hit_monster = True
+        # Draw monsters
+        for rect in self.world.monsters.draw(
+            self.window, self.step_clock.alpha, camera_x
+        ):
+            self.renderer.mark(rect)
 
-        # Play the robot. Takes the game inputs and hitbox data as arguments.
-        self.robot.play(self.inputs, hitbox_data)
+        # Draw the robot
+        self.renderer.mark(
+            self.world.robot.draw(self.window, self.step_clock.alpha, camera_x)
+        )
+        self.profiler.lap("entities")
 
         # Display player lives
         self.display_lives()
@@ -1380,11 +2511,74 @@ class Game:
         self.display_score(level_coin_count)
         # Display level
         self.display_level()
+        # Display the frame time overlay if it is toggled
+        if self.profiler.visible:
+            self.profiler.draw(self.renderer, self.font1, (self.window_width - 280, 20))
+        self.profiler.lap("hud")
 
         # Generate frame, clock for frame time
-        pygame.display.flip()
+        self.renderer.present()
+        self.profiler.lap("present")
+        self.profiler.end_frame()
         self.clock.tick(self.fps)
 
 
+def replay(file_name: str):
+    # Replays an input log recorded with Game(record=...) on the simulation
+    # only: no display, no menus and no frame rate limit. Levels change the
+    # same way as in the game. Returns the last world.
+    log = InputLog.load(file_name)
+    window_size = (1280, 720)
+    level = 1
+    world = World(
+        Levels.get(level, window_size), window_size, World.starting_lives(level)
+    )
+    inputs = dict.fromkeys(InputLog.keys, False)
+    tick = 0
+    while not log.finished(tick):
+        log.replay(tick, inputs)
+        outcome = world.step(inputs)
+        tick += 1
+        if outcome == World.game_over or outcome == World.level_completed:
+            level = world.next_level(outcome, window_size)
+            lives = World.starting_lives(level, world)
+            world = World(Levels.get(level, window_size), window_size, lives)
+            # A new game resets the inputs
+            inputs = dict.fromkeys(InputLog.keys, False)
+    return world
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jumpbot")
+    parser.add_argument(
+        "--record", metavar="FILE", help="record the inputs of the session to FILE"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="replay the inputs recorded in FILE as fast as possible, without a display",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write the frame times to FILE (CSV if it ends with .csv, else JSONL)",
+    )
+    args = parser.parse_args()
+
+    if args.replay is None:
+        Game(record=args.record, profile=args.profile)
+        return
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    start = time.perf_counter()
+    world = replay(args.replay)
+    seconds = time.perf_counter() - start
+    ticks = InputLog.load(args.replay).ticks
+    print(
+        f"Replayed {ticks} ticks in {seconds:.2f} s ({ticks / seconds:.0f} ticks/s), "
+        f"ended with {world.lives} lives and {world.coin_count} coins"
+    )
+
+
 if __name__ == "__main__":
-    Game()
+    main()
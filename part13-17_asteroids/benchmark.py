@@ -0,0 +1,340 @@
+# Headless benchmark of Asteroids. Stress scenarios spawn asteroids at a fixed rate
+# (asteroids per tick) or keep a fixed number of asteroids on the screen. Every
+# scenario is run once for the simulation only (AsteroidField.step(), in ticks per
+# second) and once with rendering (drawing the asteroids and the robot, and pushing
+# the frame to the display, in frames per second). A third run of the frames traces
+# the memory allocations. The random number generator is seeded and the robot
+# follows the same scripted inputs every run.
+# The "game" scenario replays a scripted session (see session()) of --ticks ticks
+# through the whole game loop (AsteroidGame, with the hearts, the HUD, the dirty
+# rectangles and the frame profiler), one tick per frame. Replays draw on an
+# offscreen window, so pushing the frames to the display isn't measured there.
+# The "restart-soak" scenario plays the session until the game has been restarted
+# --restarts times (after game over), and samples the peak RSS and the number of
+# objects tracked by the garbage collector, which should stay flat.
+# The results are printed as JSON lines (one line per scenario), so they can be
+# compared between builds to catch performance regressions.
+# Usage: python benchmark.py [--ticks N] [--frames N] [--restarts N] [--output FILE]
+import os
+
+# Run without a window, from the folder of the game (the assets are loaded
+# relative to it)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import gc
+import json
+import resource
+import tempfile
+import time
+import tracemalloc
+import pygame
+from main import (
+    Asteroid,
+    AsteroidField,
+    AsteroidGame,
+    DirtyRectRenderer,
+    FrameProfiler,
+    InputLog,
+    Robot,
+    SessionRandom,
+)
+
+# Scenarios: (name, spawn rate in asteroids per tick or None, fixed number of
+# asteroids or None)
+scenarios = [
+    ("rate-0.1", 0.1, None),
+    ("rate-0.5", 0.5, None),
+    ("rate-2", 2, None),
+    ("count-50", None, 50),
+    ("count-200", None, 200),
+    ("count-800", None, 800),
+]
+seed = 2023
+# Ticks of the session per restart, to size its input log for the soak (a game
+# of the session takes about 2500 ticks)
+ticks_per_restart = 4000
+# Number of memory samples of the soak
+soak_samples = 10
+
+
+def script(tick: int, inputs: dict):
+    # Scripted inputs: runs to the right and back (turning around every 4
+    # seconds), sprints half of the time and jumps and double jumps regularly
+    inputs["to_right"] = tick % 480 < 240
+    inputs["to_left"] = not inputs["to_right"]
+    inputs["is_running"] = tick % 240 < 120
+    if tick % 50 == 0:
+        inputs["is_jumping"] = True
+    elif tick % 50 == 12 and inputs["is_jumping"]:
+        inputs["is_double_jumping"] = True
+
+
+def session(tick: int, inputs: dict):
+    # Scripted inputs of a whole game session: runs to the right and back
+    # (turning around every 4 seconds) while sprinting, and presses 'Esc' every 4
+    # seconds in between, which pauses or unpauses the game, or restarts it after
+    # game over. The robot doesn't jump: it resets the jump inputs itself when it
+    # lands, and a log that is made up in advance can't know when.
+    inputs["to_right"] = tick % 480 < 240
+    inputs["to_left"] = not inputs["to_right"]
+    inputs["is_running"] = True
+    inputs["pause_status_change"] = tick % 240 == 120
+
+
+def session_log(file_name: str, ticks: int):
+    # Writes the input log of ticks ticks of the session to the file, so the game
+    # can replay it. The game resets the pause input in the same tick, like it
+    # does when recording.
+    log = InputLog(seed)
+    inputs = dict.fromkeys(InputLog.keys, False)
+    for tick in range(ticks):
+        session(tick, inputs)
+        log.record(tick, inputs)
+        inputs["pause_status_change"] = False
+        log.end_tick(tick, inputs)
+    log.save(file_name)
+
+
+class AllocationProfiler(FrameProfiler):
+    # Frame profiler of the game that also measures the memory allocated within
+    # every frame (while tracemalloc is tracing)
+    def __init__(self):
+        super().__init__()
+        self.allocations = []
+        self.__current = 0
+
+    def begin_frame(self):
+        self.__current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        super().begin_frame()
+
+    def end_frame(self):
+        super().end_frame()
+        self.allocations.append(tracemalloc.get_traced_memory()[1] - self.__current)
+
+
+def rate(step, count: int):
+    # Calls step(i) count times, returns the number of calls per second
+    start = time.perf_counter()
+    for i in range(count):
+        step(i)
+    return count / (time.perf_counter() - start)
+
+
+def allocations(step, count: int):
+    # Calls step(i) count times while tracing the memory allocations. Returns
+    # the mean and maximum of the memory allocated within a call (in bytes),
+    # and the number of generation 0 garbage collections.
+    collections = gc.get_stats()[0]["collections"]
+    peaks = []
+    tracemalloc.start()
+    for i in range(count):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step(i)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return (
+        sum(peaks) / count,
+        max(peaks),
+        gc.get_stats()[0]["collections"] - collections,
+    )
+
+
+class Scenario:
+    # Asteroid field that is filled according to a spawn rate or a fixed
+    # number of asteroids, and the robot
+    def __init__(self, window: pygame.surface.Surface, spawn_rate: float, count: int):
+        self.field = AsteroidField(window, SessionRandom(seed))
+        self.robot = Robot(window)
+        self.inputs = dict.fromkeys(
+            ["to_left", "to_right", "is_running", "is_jumping", "is_double_jumping"],
+            False,
+        )
+        self.__spawn_rate = spawn_rate
+        self.__count = count
+        # Asteroids due to spawn (fractional spawn rates)
+        self.__due = 0
+
+    def spawn(self):
+        if self.__spawn_rate is not None:
+            self.__due += self.__spawn_rate
+            while self.__due >= 1:
+                self.field.spawn()
+                self.__due -= 1
+        else:
+            while len(self.field) < self.__count:
+                self.field.spawn()
+
+
+def benchmark_scenario(
+    window: pygame.surface.Surface,
+    renderer: DirtyRectRenderer,
+    name: str,
+    spawn_rate: float,
+    count: int,
+    ticks: int,
+    frames: int,
+):
+    # Simulation only
+    scenario = Scenario(window, spawn_rate, count)
+
+    def tick(i: int):
+        script(i, scenario.inputs)
+        scenario.robot.play(scenario.inputs)
+        scenario.spawn()
+        scenario.field.step(scenario.robot.get_hitbox())
+
+    ticks_per_second = rate(tick, ticks)
+    asteroids = len(scenario.field)
+
+    # Simulation and rendering
+    scenario = Scenario(window, spawn_rate, count)
+    renderer.invalidate()
+
+    def frame(i: int):
+        pygame.event.pump()
+        script(i, scenario.inputs)
+        scenario.robot.play(scenario.inputs)
+        scenario.spawn()
+        scenario.field.step(scenario.robot.get_hitbox())
+        renderer.begin_frame()
+        renderer.mark(scenario.robot.draw())
+        for rect in scenario.field.draw():
+            renderer.mark(rect)
+        renderer.present()
+
+    frames_per_second = rate(frame, frames)
+    alloc_mean, alloc_max, collections = allocations(frame, frames)
+
+    return {
+        "game": "asteroids",
+        "scenario": name,
+        "asteroids": asteroids,
+        "ticks": ticks,
+        "ticks_per_s": round(ticks_per_second, 1),
+        "frames": frames,
+        "fps": round(frames_per_second, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "alloc_bytes_per_frame_mean": round(alloc_mean),
+        "alloc_bytes_per_frame_max": alloc_max,
+        "gc_gen0_collections": collections,
+    }
+
+
+def benchmark_game(log_file: str, ticks: int):
+    # The whole game loop, replaying ticks ticks of the session
+    session_log(log_file, ticks)
+    game = AsteroidGame(replay=log_file)
+    start = time.perf_counter()
+    restarts = game.execute()
+    frames_per_second = game.ticks / (time.perf_counter() - start)
+
+    # Again with the memory allocations traced
+    profiler = AllocationProfiler()
+    game = AsteroidGame(replay=log_file, profiler=profiler)
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    game.execute()
+    tracemalloc.stop()
+    allocations = profiler.allocations
+
+    return {
+        "game": "asteroids",
+        "scenario": "game",
+        "restarts": restarts,
+        "frames": game.ticks,
+        "fps": round(frames_per_second, 1),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "alloc_bytes_per_frame_mean": round(sum(allocations) / len(allocations)),
+        "alloc_bytes_per_frame_max": max(allocations),
+        "gc_gen0_collections": gc.get_stats()[0]["collections"] - collections,
+    }
+
+
+def benchmark_soak(log_file: str, restarts: int):
+    # Restarts the game restarts times, sampling the memory (after a garbage
+    # collection) soak_samples times in between
+    session_log(log_file, restarts * ticks_per_restart)
+    game = AsteroidGame(replay=log_file)
+    count = 0
+    rss, objects = [], []
+    start = time.perf_counter()
+    for sample in range(1, soak_samples + 1):
+        due = restarts * sample // soak_samples - count
+        if due > 0:
+            count += game.execute(max_restarts=due)
+        gc.collect()
+        rss.append(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        objects.append(len(gc.get_objects()))
+    seconds = time.perf_counter() - start
+
+    return {
+        "game": "asteroids",
+        "scenario": "restart-soak",
+        "restarts": count,
+        "ticks": game.ticks,
+        "ticks_per_s": round(game.ticks / seconds, 1),
+        "peak_rss_kb": rss[-1],
+        "peak_rss_kb_samples": rss,
+        "gc_objects_samples": objects,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asteroids benchmark")
+    parser.add_argument(
+        "--ticks", type=int, default=3000, help="simulation ticks per scenario"
+    )
+    parser.add_argument(
+        "--frames", type=int, default=600, help="rendered frames per scenario"
+    )
+    parser.add_argument(
+        "--restarts",
+        type=int,
+        default=100,
+        help="restarts of the game in the soak (0 to skip it)",
+    )
+    parser.add_argument(
+        "--output", metavar="FILE", help="also write the results to FILE"
+    )
+    args = parser.parse_args()
+
+    # Same window and pre-rendered asteroid images as the game
+    pygame.init()
+    window = pygame.display.set_mode((640, 480))
+    Asteroid.atlas.prerender(Asteroid.scales, (1, 1.5))
+    background = pygame.Surface(window.get_size())
+    renderer = DirtyRectRenderer(window)
+    renderer.set_background(background)
+
+    results = []
+    for name, spawn_rate, count in scenarios:
+        result = benchmark_scenario(
+            window, renderer, name, spawn_rate, count, args.ticks, args.frames
+        )
+        print(json.dumps(result), flush=True)
+        results.append(result)
+
+    # The game loop and the soak replay input logs of the session
+    with tempfile.TemporaryDirectory() as folder:
+        log_file = os.path.join(folder, "session.log")
+        result = benchmark_game(log_file, args.ticks)
+        print(json.dumps(result), flush=True)
+        results.append(result)
+        if args.restarts > 0:
+            result = benchmark_soak(log_file, args.restarts)
+            print(json.dumps(result), flush=True)
+            results.append(result)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
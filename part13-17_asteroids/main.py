@@ -4,16 +4,450 @@
 # that loads the high score from a file, asteroids of randomized sizes and with randomized
 # paths, etc.)
 import pygame
-from random import randint
+from random import randrange
 import numpy as np
+from collections import OrderedDict, deque
+import argparse
+import csv
+import json
+import os
+import struct
+import time
+
+
+class ImageCache:
+    # Process-wide cache for the images of the game. Every image file is loaded
+    # from disk (and converted to the pixel format of the display) only once,
+    # after which the robot, the hearts and the HUD share the same image. The
+    # rotated and scaled asteroids don't need any more than that, their atlas
+    # (see AsteroidAtlas) renders them from the loaded image in advance.
+    # N.B. the images are shared, so never draw on an image that comes out of
+    # the cache. Make a copy first.
+    # Jumpbot (part-14-1_jumpbot) has its own copy of this class, with scaled
+    # images and fade tables on top, every exercise folder runs on its own.
+    __images = {}
+
+    @classmethod
+    def load(cls, file_name: str):
+        image = cls.__images.get(file_name)
+        if image is None:
+            image = pygame.image.load(file_name)
+            # Converting the pixel format is only possible once the display
+            # has been set up. Without a display the image is used as loaded.
+            if pygame.display.get_surface() is not None:
+                if image.get_flags() & pygame.SRCALPHA:
+                    image = image.convert_alpha()
+                else:
+                    image = image.convert()
+            cls.__images[file_name] = image
+        return image
+
+
+class TextCache:
+    # Process-wide cache for rendered texts. Rendering a text with a font is
+    # one of the most expensive calls in a frame, while the score, high score,
+    # pause and game over texts stay the same for many frames in a row.
+    # Rendered texts are kept in a least recently used cache, with the font,
+    # text, color and antialiasing as key. A text is therefore only rendered
+    # again when it changes (e.g. when the score goes up).
+    # Jumpbot (part-14-1_jumpbot) has its own, identical copy of this class.
+    max_texts = 256
+    __texts = OrderedDict()
+
+    @classmethod
+    def render(cls, font: pygame.font.Font, text: str, antialias: bool, color: tuple):
+        # Same arguments as font.render(), but the font itself comes first
+        key = (font, text, tuple(color), antialias)
+        rendered = cls.__texts.get(key)
+        if rendered is None:
+            rendered = font.render(text, antialias, color)
+            cls.__texts[key] = rendered
+            if len(cls.__texts) > cls.max_texts:
+                cls.__texts.popitem(last=False)
+        else:
+            cls.__texts.move_to_end(key)
+        return rendered
+
+
+class DirtyRectRenderer:
+    # Renders frames by only updating the parts of the window that have changed
+    # ("dirty rectangles"), instead of clearing and updating the whole window
+    # every frame. The background is plain black, and the robot, asteroids,
+    # hearts and HUD report the area they cover, either by drawing through
+    # self.blit() or by passing the rectangle to self.mark(). At the start of
+    # the next frame only these areas are restored from the background, and
+    # only the areas of the previous and the current frame are pushed to the
+    # display. Replays draw on an offscreen surface instead of the display.
+    # When disabled, every frame is a full redraw of the background followed
+    # by pygame.display.flip() (fallback).
+    # Jumpbot (part-14-1_jumpbot) has its own copy of this class, which can
+    # also redraw a background that scrolled.
+    def __init__(self, window: pygame.surface.Surface, enabled: bool = True):
+        self.__window = window
+        self.__window_rect = window.get_rect()
+        self.__background = None
+        self.enabled = enabled
+        # Rectangles drawn in the previous and in the current frame
+        self.__previous_rects = []
+        self.__rects = []
+        # Whether the next frame has to start by restoring the whole background
+        self.__redraw = True
+        # Whether the current frame has to be pushed to the display in full
+        self.__full = True
+        # Nothing is pushed to the display when drawing on an offscreen
+        # surface (e.g. when replaying an input log)
+        self.__offscreen = window is not pygame.display.get_surface()
+
+    @property
+    def full_redraw(self):
+        # True when the current frame covers the whole window
+        return self.__full or not self.enabled
+
+    def set_background(self, background: pygame.surface.Surface):
+        # Surface (the size of the window) that the frames are drawn on top of
+        self.__background = background
+        self.invalidate()
+
+    def invalidate(self):
+        # Call when something has been drawn over the whole window without
+        # reporting it (e.g. a menu or a flash). The current frame will be
+        # pushed to the display in full, and the next one starts with the
+        # whole background.
+        self.__redraw = True
+        self.__full = True
+
+    def begin_frame(self):
+        # Restores the background where things were drawn in the last frame
+        if self.__redraw or not self.enabled:
+            self.__window.blit(self.__background, (0, 0))
+            self.__redraw = False
+            self.__full = True
+        else:
+            for rect in self.__previous_rects:
+                self.__window.blit(self.__background, rect, rect)
+        self.__rects = []
+
+    def mark(self, rect: pygame.Rect):
+        # Reports an area of the window that has been drawn on in this frame
+        rect = self.__window_rect.clip(rect)
+        if rect.width > 0 and rect.height > 0:
+            self.__rects.append(rect)
+
+    def blit(self, image: pygame.surface.Surface, position: tuple):
+        # Draws an image on the window and reports the area it covers
+        rect = self.__window.blit(image, position)
+        self.mark(rect)
+        return rect
+
+    def present(self):
+        # Pushes the frame to the display
+        if self.__offscreen:
+            pass
+        elif self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.__previous_rects + self.__rects)
+        self.__previous_rects = self.__rects
+        self.__full = False
+
+
+class InputLog:
+    # Compact binary recording of the inputs of a game session, so the session
+    # can be simulated again exactly (e.g. to reproduce a bug, or to measure
+    # the speed of the simulation on the same workload). Only changes are
+    # stored: every record holds the tick at which the inputs changed and a
+    # bitmask of the values of the input keys (one bit per key in self.keys).
+    # The file starts with a header holding the seed of the random number
+    # generator (see SessionRandom) and the total number of ticks recorded.
+    # The pause key is logged too, since it also restarts the game after game
+    # over, so a replay runs through the whole game loop, restarts included.
+    # Jumpbot (part-14-1_jumpbot) has its own copy of this class, without the
+    # pause key.
+    magic = b"INPT"
+    keys = (
+        "to_left",
+        "to_right",
+        "is_running",
+        "is_jumping",
+        "is_double_jumping",
+        "pause_status_change",
+    )
+    __header = struct.Struct("<4sQI")
+    __record = struct.Struct("<IB")
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        # Total number of ticks recorded
+        self.ticks = 0
+        # List of (tick, bitmask) tuples
+        self.records = []
+        # Bitmask at the end of the previous tick (when recording), and the
+        # index of the next record to apply (when replaying)
+        self.__mask = None
+        self.__next = 0
+
+    @classmethod
+    def mask(cls, inputs: dict):
+        # Bitmask of the values of the input keys
+        mask = 0
+        for bit, key in enumerate(cls.keys):
+            if inputs[key]:
+                mask |= 1 << bit
+        return mask
+
+    @classmethod
+    def apply(cls, mask: int, inputs: dict):
+        # Sets the input keys to the values in the bitmask
+        for bit, key in enumerate(cls.keys):
+            inputs[key] = bool(mask >> bit & 1)
+
+    def record(self, tick: int, inputs: dict):
+        # Call before a tick is simulated. The inputs are only stored when they
+        # changed since the end of the previous tick (key presses, or the game
+        # resetting them).
+        mask = self.mask(inputs)
+        if mask != self.__mask:
+            self.records.append((tick, mask))
+
+    def end_tick(self, tick: int, inputs: dict):
+        # Call after a tick is simulated (the simulation changes some inputs
+        # itself, e.g. the jump inputs when the robot lands)
+        self.__mask = self.mask(inputs)
+        self.ticks = tick + 1
+
+    def replay(self, tick: int, inputs: dict):
+        # Sets the inputs recorded for this tick (if there are any)
+        while self.__next < len(self.records) and self.records[self.__next][0] <= tick:
+            self.apply(self.records[self.__next][1], inputs)
+            self.__next += 1
+
+    def finished(self, tick: int):
+        # True when all recorded ticks have been replayed
+        return tick >= self.ticks
+
+    def save(self, file_name: str):
+        with open(file_name, "wb") as f:
+            f.write(self.__header.pack(self.magic, self.seed, self.ticks))
+            for record in self.records:
+                f.write(self.__record.pack(*record))
+
+    @classmethod
+    def load(cls, file_name: str):
+        with open(file_name, "rb") as f:
+            data = f.read()
+        magic, seed, ticks = cls.__header.unpack_from(data)
+        if magic != cls.magic:
+            raise ValueError(f"{file_name} is not an input log")
+        log = cls(seed)
+        log.ticks = ticks
+        log.records = list(cls.__record.iter_unpack(data[cls.__header.size :]))
+        return log
+
+
+class FrameProfiler:
+    # Measures how long the different parts ("sections") of every frame take,
+    # using a monotonic nanosecond clock. The game calls self.begin_frame() at
+    # the start of a frame and self.lap(section) after every part of the
+    # frame, which adds the time since the previous lap to that section (a
+    # section can be lapped more than once per frame). The last frames are
+    # kept to calculate rolling percentiles of every section, which are shown
+    # in an overlay when self.visible is True. Optionally, the times of every
+    # frame (in nanoseconds) are written to a CSV or JSONL file, depending on
+    # the extension of the file name (e.g. to compare builds).
+    # In Asteroids, "physics" covers the robot, the spawner and the collisions,
+    # "world" only restores the black background where the previous frame drew,
+    # and "entities" are the robot, asteroids and hearts.
+    # Jumpbot (part-14-1_jumpbot) has its own, identical copy of this class.
+    sections = ("input", "physics", "world", "entities", "hud", "present")
+    # Number of frames used for the percentiles
+    history = 600
+    # Number of frames between updates of the overlay
+    refresh = 30
+
+    def __init__(self, dump: str = None):
+        self.visible = False
+        # Number of frames measured
+        self.frames = 0
+        self.__history = {
+            section: deque(maxlen=self.history)
+            for section in self.sections + ("total",)
+        }
+        self.__times = dict.fromkeys(self.sections, 0)
+        self.__last = time.perf_counter_ns()
+        # Rendered lines of the overlay
+        self.__overlay = []
+        # File the frame times are written to
+        self.__dump = None
+        self.__csv = None
+        if dump is not None:
+            self.__dump = open(dump, "w", newline="")
+            if dump.endswith(".csv"):
+                self.__csv = csv.writer(self.__dump)
+                self.__csv.writerow(("frame",) + self.sections + ("total",))
+
+    def begin_frame(self):
+        for section in self.__times:
+            self.__times[section] = 0
+        self.__last = time.perf_counter_ns()
+
+    def lap(self, section: str):
+        # Adds the time since the previous lap to the section
+        now = time.perf_counter_ns()
+        self.__times[section] += now - self.__last
+        self.__last = now
+
+    def end_frame(self):
+        total = sum(self.__times.values())
+        for section, ns in self.__times.items():
+            self.__history[section].append(ns)
+        self.__history["total"].append(total)
+        if self.__csv is not None:
+            self.__csv.writerow(
+                (self.frames,) + tuple(self.__times.values()) + (total,)
+            )
+        elif self.__dump is not None:
+            self.__dump.write(
+                json.dumps({"frame": self.frames, **self.__times, "total": total})
+                + "\n"
+            )
+        self.frames += 1
+        # The overlay is rendered again every few frames (so it's readable and
+        # cheap to draw)
+        if self.frames % self.refresh == 0:
+            self.__overlay = []
+
+    def percentiles(self, section: str):
+        # The p50, p95 and p99 times of the section (in milliseconds) over the
+        # last frames
+        times = sorted(self.__history[section])
+        if not times:
+            return (0, 0, 0)
+        last = len(times) - 1
+        return tuple(times[int(last * p)] / 1_000_000 for p in (0.5, 0.95, 0.99))
+
+    def draw(
+        self, renderer: "DirtyRectRenderer", font: pygame.font.Font, topleft: tuple
+    ):
+        # Draws the overlay with the percentiles of every section
+        if not self.__overlay:
+            color = (255, 255, 0)
+            lines = ["Frame times (p50 / p95 / p99)"]
+            for section in self.sections + ("total",):
+                p50, p95, p99 = self.percentiles(section)
+                lines.append(f"{section}: {p50:.2f} / {p95:.2f} / {p99:.2f} ms")
+            self.__overlay = [
+                TextCache.render(font, line, True, color) for line in lines
+            ]
+        x, y = topleft
+        for line in self.__overlay:
+            renderer.blit(line, (x, y))
+            y += line.get_height()
+
+    def close(self):
+        # Stops writing the frame times to the file (the game can go on)
+        if self.__dump is not None:
+            self.__dump.close()
+            self.__dump = None
+            self.__csv = None
+
+
+class FixedStepClock:
+    # Fixed timestep scheduler, decouples the simulation from the frame rate.
+    # Every frame, the real time that passed since the previous frame is added
+    # to an accumulator, and self.ticks() returns how many ticks of the
+    # simulation fit in it. Slow frames are caught up with by simulating more
+    # ticks (up to max_ticks per frame, after a longer stall the rest of the
+    # time is dropped), fast frames simulate no tick at all. The time left in
+    # the accumulator, as a fraction of a tick (self.alpha), is used to draw
+    # things in between their previous and current position (the robot, the
+    # asteroids and the hearts).
+    # In lockstep, every frame is exactly one tick (e.g. for benchmarks and
+    # replays of an input log).
+    # Jumpbot (part-14-1_jumpbot) has its own, identical copy of this class.
+    max_ticks = 5
+
+    def __init__(self, tick_rate: int):
+        self.__tick_time = 1_000_000_000 // tick_rate
+        self.lockstep = False
+        self.__accumulator = 0
+        self.__last = None
+
+    def reset(self):
+        # Forget the time that passed (e.g. after a pause or a menu), the next
+        # frame will be exactly one tick
+        self.__accumulator = 0
+        self.__last = None
+
+    def ticks(self):
+        # Number of ticks to simulate in this frame
+        if self.lockstep:
+            return 1
+        now = time.perf_counter_ns()
+        if self.__last is None:
+            self.__accumulator += self.__tick_time
+        else:
+            self.__accumulator += now - self.__last
+        self.__last = now
+        ticks = self.__accumulator // self.__tick_time
+        if ticks > self.max_ticks:
+            self.__accumulator = 0
+            return self.max_ticks
+        self.__accumulator -= ticks * self.__tick_time
+        return ticks
+
+    @property
+    def alpha(self):
+        # Fraction of a tick between the last simulated tick and now
+        if self.lockstep:
+            return 1
+        return self.__accumulator / self.__tick_time
+
+
+class SessionRandom:
+    # Random number generator of a game session. It is created with a seed and
+    # passed to everything that needs random values, so a session can be
+    # reproduced (see InputLog). Every kind of random value has its own stream
+    # (e.g. the spawn rolls don't shift when the asteroid sizes draw more
+    # values). A single NumPy call is slow compared to drawing one value, so
+    # the values of a stream are generated in batches and handed out from a
+    # buffer.
+    streams = ("spawn", "position", "size", "angle", "velocity")
+    batch_size = 1024
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        sequences = np.random.SeedSequence(seed).spawn(len(self.streams))
+        self.__generators = {
+            stream: np.random.default_rng(sequence)
+            for stream, sequence in zip(self.streams, sequences)
+        }
+        # Buffers of uniform (0 <= value < 1) and standard normal values
+        self.__uniform = {stream: [] for stream in self.streams}
+        self.__normal = {stream: [] for stream in self.streams}
+
+    def randint(self, stream: str, low: int, high: int):
+        # Random integer from low to high (both included), like random.randint()
+        buffer = self.__uniform[stream]
+        if not buffer:
+            buffer.extend(self.__generators[stream].random(self.batch_size).tolist())
+        return low + int(buffer.pop() * (high - low + 1))
+
+    def normal(self, stream: str, scale: float):
+        # Random value from a normal distribution with mean 0
+        buffer = self.__normal[stream]
+        if not buffer:
+            buffer.extend(
+                self.__generators[stream].standard_normal(self.batch_size).tolist()
+            )
+        return buffer.pop() * scale
 
 
 class Robot:
     def __init__(self, window: pygame.surface.Surface):
         # Different images of the robot for jumping animations
-        self.__robot = pygame.image.load("robot.png")
-        self.__robot_jumping_left = pygame.image.load("robot_jumping_l.png")
-        self.__robot_jumping_right = pygame.image.load("robot_jumping_r.png")
+        self.__robot = ImageCache.load("robot.png")
+        self.__robot_jumping_left = ImageCache.load("robot_jumping_l.png")
+        self.__robot_jumping_right = ImageCache.load("robot_jumping_r.png")
         # Setting window and determining window sizes
         self.__window = window
         self.__window_w = window.get_width()
@@ -23,6 +457,21 @@ class Robot:
         self.__x = self.__window_w / 2
         self.__y_initial = self.__window_h - self.__robot.get_height()
         self.__y = self.__y_initial
+        # Coordinates at the end of the previous tick (the robot is drawn in
+        # between these and the current coordinates) and the current image
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
+        self.__image = self.__robot
+        # The hitbox (see get_hitbox()) is one rectangle that is moved in place
+        # when the robot has moved, together with the coordinates it was last
+        # moved to and its offset from the topleft corner of the image. The
+        # robot never goes left of or above the window, and for coordinates
+        # that aren't negative moving the rectangle gives the same result as
+        # scaling a new rectangle every time.
+        self.__hitbox = self.__robot.get_rect().scale_by(0.95)
+        self.__hitbox_offset = self.__hitbox.topleft
+        self.__hitbox_x = None
+        self.__hitbox_y = None
         # Setting hights for jumps and double jumps separately. Generally, having the
         # double jump value a little higher 'feels' better in this 'game'.
         self.__height_of_jump = 13
@@ -35,17 +484,24 @@ class Robot:
         self.__y_velocity = self.__height_of_jump
 
     def play(self, inputs: dict):
-        # Main function of the robot. Calls on the move() function which calculates
-        # new coordinates and changes input values when necessary
+        # Main function of the robot, advances it by one tick. Calls on the
+        # move() function which calculates new coordinates and changes input
+        # values when necessary
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
         self.__move(inputs)
-        # Plot the image on the screen
-        self.__window.blit(
-            self.__jump_image(
-                inputs["to_left"], inputs["to_right"], inputs["is_jumping"]
-            ),
-            (self.__x, self.__y),
+        self.__image = self.__jump_image(
+            inputs["to_left"], inputs["to_right"], inputs["is_jumping"]
         )
 
+    def draw(self, alpha: float = 1):
+        # Plot the image on the screen, return the area it covers. Alpha is the
+        # fraction of the way from the coordinates of the previous tick to the
+        # current coordinates (see FixedStepClock).
+        x = self.__x_last_tick + (self.__x - self.__x_last_tick) * alpha
+        y = self.__y_last_tick + (self.__y - self.__y_last_tick) * alpha
+        return self.__window.blit(self.__image, (x, y))
+
     def __move(self, inputs: dict):
         # Input is a dict containing 5 boolean values: to_left, to_right, is_running, is_jumping, is_double_jumping
         x_velocity = self.__base_movement_speed(inputs["to_left"], inputs["to_right"])
@@ -176,47 +632,133 @@ class Robot:
             return self.__robot_jumping_left
 
     def get_hitbox(self):
-        # Create a hitbox (rectangle object) on the position. Although it uses the
+        # Return the hitbox (rectangle object) on the position. Although it uses the
         # robot.png image, this will still work with the jumping images, since
-        # they are the same size.
-        robot_hitbox = self.__robot.get_rect(topleft=(self.__x, self.__y))
-        # Decrease hitbox size by 5% (this simply 'felt' better in game because
-        # the robot image has some empty pixels)
-        robot_hitbox = robot_hitbox.scale_by(0.95)
-        return robot_hitbox
+        # they are the same size. The hitbox size is decreased by 5% (this simply
+        # 'felt' better in game because the robot image has some empty pixels).
+        # The same rectangle is returned every time and it's only moved when the
+        # robot has moved since the last call, so the callers must not change it.
+        if self.__x != self.__hitbox_x or self.__y != self.__hitbox_y:
+            self.__hitbox_x = self.__x
+            self.__hitbox_y = self.__y
+            self.__hitbox.topleft = (self.__x, self.__y)
+            self.__hitbox.move_ip(self.__hitbox_offset)
+        return self.__hitbox
 
     def reset(self):
         # Reset robot to starting position after game over
         self.__x = self.__window_w / 2
         self.__y = self.__y_initial
+        self.__x_last_tick = self.__x
+        self.__y_last_tick = self.__y
+
+
+class AsteroidAtlas:
+    # Pre-rendered versions ("variants") of the asteroid image. Instead of
+    # rotating, scaling and flipping the image every time an asteroid spawns,
+    # a variant is picked from this atlas. There is a limited number of
+    # variants: every combination of rotation (in steps of 360 / rotations
+    # degrees), scale, size multiplier and horizontal flip. A vertical flip is
+    # not needed, since that's the same as a horizontal flip rotated by 180
+    # degrees. The hitbox of every variant is computed together with the image.
+    rotations = 24
+
+    def __init__(self, file_name: str):
+        self.__file_name = file_name
+        # Variants by (rotation, scale, multiplier, flip) key, the values are
+        # (image, hitbox) tuples
+        self.__variants = {}
+
+    def variant(self, rotation: int, scale: float, multiplier: float, flip: bool):
+        # Returns the (image, hitbox) tuple of a variant. The hitbox is a tuple
+        # with the position relative to the image and the size of the hitbox.
+        # Variants are rendered on first use (see also self.prerender()).
+        key = (rotation, scale, multiplier, flip)
+        variant = self.__variants.get(key)
+        if variant is None:
+            variant = self.__render(rotation, scale, multiplier, flip)
+            self.__variants[key] = variant
+        return variant
+
+    def prerender(self, scales: tuple, multipliers: tuple):
+        # Renders all variants with the given scales and multipliers in advance
+        for rotation in range(AsteroidAtlas.rotations):
+            for scale in scales:
+                for multiplier in multipliers:
+                    for flip in (False, True):
+                        self.variant(rotation, scale, multiplier, flip)
+
+    def __render(self, rotation: int, scale: float, multiplier: float, flip: bool):
+        image = ImageCache.load(self.__file_name)
+        image = pygame.transform.rotate(image, rotation * 360 / AsteroidAtlas.rotations)
+        # The size changes depending on rotation, we pick it up here
+        w = image.get_width()
+        h = image.get_height()
+        image = pygame.transform.scale(
+            image, (w * scale * multiplier, h * scale * multiplier)
+        )
+        image = pygame.transform.flip(image, flip, False)
+        # Hitbox is the image rectangle decreased in scale by 10% (collision
+        # corresponds better to the actual image displayed this way)
+        hitbox = image.get_rect().scale_by(0.90)
+        return image, (hitbox.x, hitbox.y, hitbox.width, hitbox.height)
 
 
 class Asteroid:
+    # Asteroid objects are reused (see AsteroidField and HeartPool), which is
+    # why they use slots instead of an attribute dictionary
+    __slots__ = (
+        "_points",
+        "_object",
+        "_hitbox",
+        "_window",
+        "_window_w",
+        "_window_h",
+        "_x",
+        "_y",
+        "_y_speed",
+        "_x_speed",
+        "_rotation_angle",
+        "_random",
+    )
     speed = 1
+    # Possible scales of the asteroid image (see self._randomize()), and the
+    # atlas with the pre-rendered images
+    scales = (0.2, 0.3, 0.4, 0.5)
+    atlas = AsteroidAtlas("asteroid.png")
 
-    def __init__(self, window: pygame.surface.Surface):
+    def __init__(self, window: pygame.surface.Surface, random: SessionRandom):
+        # Random number generator of the session
+        self._random = random
+        # Setting window and determining window sizes
+        self._window = window
+        self._window_w = window.get_width()
+        self._window_h = window.get_height()
+        self.reset()
+
+    def reset(self):
+        # (Re)spawns the asteroid with new random values, so the same object
+        # can be used again for a new asteroid.
         # The number of points an asteroid is worth. Base value is 1. Randomizer
         # creates larger asteroids occasionally that are worth more points. Needs
         # to be defined before the randomization of asteroid below, since
         # it alters this value sometimes.
         self._points = 1
-        # Loading asteroid image
-        self._object = self._randomize()
-        # Setting window and determining window sizes
-        self._window = window
-        self._window_w = window.get_width()
-        self._window_h = window.get_height()
+        # Loading asteroid image (and its hitbox)
+        self._object, self._hitbox = self._randomize()
         # Set initial position of the randomly spawning asteroid
         # Spawns above the upper screen border and on a random horizontal coordinate
-        self._x = randint(0, self._window_w - self._object.get_width())
+        self._x = self._random.randint(
+            "position", 0, self._window_w - self._object.get_width()
+        )
         self._y = -self._object.get_height()
         # Speed in the vertical direction is class speed + random number ranging from
         # -0,5 (50% speed) to 1,0 (200% speed)
-        self._y_speed = Asteroid.speed + (randint(-5, 10) / 10)
+        self._y_speed = Asteroid.speed + (self._random.randint("velocity", -5, 10) / 10)
         # Speed in the horizontal direction with normal distribution with mean 0
-        self._x_speed = np.random.normal(0, self._y_speed * 0.08, 1)[0]
+        self._x_speed = self._random.normal("velocity", self._y_speed * 0.08)
         # Rotation angle
-        self._rotation_angle = randint(0, 90) / 1000
+        self._rotation_angle = self._random.randint("angle", 0, 90) / 1000
 
     @property
     def points(self):
@@ -230,18 +772,16 @@ class Asteroid:
         return coordinates
 
     def _randomize(self):
-        # This method randomizes the asteroid size, angle and orientation
-        asteroid = pygame.image.load("asteroid.png")
+        # This method randomizes the asteroid size, angle and orientation. The
+        # resulting image is picked from the pre-rendered atlas.
         # Pick a random angle for the image
-        angle = randint(0, 359)
-        asteroid = pygame.transform.rotate(asteroid, angle)
-        # The size changes depending on rotation, we pick it up here
-        w = asteroid.get_width()
-        h = asteroid.get_height()
+        rotation = self._random.randint("angle", 0, AsteroidAtlas.rotations - 1)
         # We randomize the scale, being between 20-50% of the original
-        scale = randint(2, 5) / 10
+        scale = Asteroid.scales[
+            self._random.randint("size", 0, len(Asteroid.scales) - 1)
+        ]
         # 10% chance to increase size by 50%, 3% chance to increase size by 100%
-        scale_percent = randint(0, 100)
+        scale_percent = self._random.randint("size", 0, 100)
         if scale_percent < 10:
             multiplier = 1.5
             # Asteroid worth 2 points when this multiplier is applied
@@ -252,15 +792,10 @@ class Asteroid:
             self._points = 3
         else:
             multiplier = 1
-        asteroid = pygame.transform.scale(
-            asteroid, (w * scale * multiplier, h * scale * multiplier)
-        )
-        # Random horizontal/vertical flips
-        asteroid = pygame.transform.flip(
-            asteroid, bool(randint(0, 1)), bool(randint(0, 1))
-        )
-        # Return the randomized image
-        return asteroid
+        # Random horizontal flip
+        flip = bool(self._random.randint("angle", 0, 1))
+        # Return the randomized image and its hitbox
+        return Asteroid.atlas.variant(rotation, scale, multiplier, flip)
 
     def _get_hitbox(self):
         # Create the hitbox of the asteroid
@@ -292,18 +827,247 @@ class Asteroid:
         # Condition not met, so no collision
         return False
 
+    def state(self):
+        # Returns the image, position, velocity, hitbox (position relative to
+        # the asteroid, and size) and points of the asteroid, used when adding
+        # the asteroid to an AsteroidField
+        return (
+            self._object,
+            (self._x, self._y),
+            (self._x_speed, self._y_speed),
+            self._hitbox,
+            self._points,
+        )
+
     def fall(self):
-        self._window.blit(self._object, self._next_coordinates())
+        # Moves the object by one tick
+        self._next_coordinates()
+
+    def draw(self, alpha: float = 1):
+        # Returns the area of the window the object covers. The object is drawn
+        # in between its previous and current position (see Robot.draw()).
+        return self._window.blit(
+            self._object,
+            (
+                self._x - self._x_speed * (1 - alpha),
+                self._y - self._y_speed * (1 - alpha),
+            ),
+        )
+
+
+class AsteroidField:
+    # All asteroids that are currently falling, stored as a "structure of
+    # arrays": the positions, velocities, hitboxes and points of the asteroids
+    # are kept in NumPy arrays (one element per asteroid). This way, every
+    # frame a single vectorized step moves all asteroids, checks them for
+    # collision with the robot, and removes the ones that have been hit or that
+    # have fallen off the screen, instead of doing all of this for every
+    # asteroid object separately. The images are drawn in one batch.
+    # The arrays have a fixed capacity and work as a pool of slots: spawning
+    # an asteroid fills a free slot, and removing one only marks its slot as
+    # free again. Nothing is allocated when asteroids spawn and disappear
+    # (unless the field is full, in which case the capacity is doubled).
+    def __init__(
+        self,
+        window: pygame.surface.Surface,
+        random: SessionRandom,
+        capacity: int = 256,
+    ):
+        self.__window = window
+        self.__window_h = window.get_height()
+        # Asteroid object that is reset for every spawn, its randomized values
+        # are copied into a free slot
+        self.__spawn = Asteroid(window, random)
+        # Position and velocity
+        self.__x = np.zeros(capacity)
+        self.__y = np.zeros(capacity)
+        self.__x_speed = np.zeros(capacity)
+        self.__y_speed = np.zeros(capacity)
+        # Hitbox position (relative to the asteroid position) and size
+        self.__hitbox_x = np.zeros(capacity)
+        self.__hitbox_y = np.zeros(capacity)
+        self.__hitbox_w = np.zeros(capacity)
+        self.__hitbox_h = np.zeros(capacity)
+        # Number of points every asteroid is worth
+        self.__points = np.zeros(capacity, dtype=int)
+        # Whether or not a slot contains a falling asteroid
+        self.__active = np.zeros(capacity, dtype=bool)
+        # Images of the asteroids
+        self.__images = [None] * capacity
+        # Free slots (the lowest slot is used first)
+        self.__free_slots = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        # Number of falling asteroids
+        return len(self.__images) - len(self.__free_slots)
+
+    def spawn(self):
+        # Spawns a new randomized asteroid in a free slot
+        if not self.__free_slots:
+            self.__grow()
+        slot = self.__free_slots.pop()
+        self.__spawn.reset()
+        image, position, speed, hitbox, points = self.__spawn.state()
+        self.__x[slot], self.__y[slot] = position
+        self.__x_speed[slot], self.__y_speed[slot] = speed
+        self.__hitbox_x[slot], self.__hitbox_y[slot] = hitbox[0], hitbox[1]
+        self.__hitbox_w[slot], self.__hitbox_h[slot] = hitbox[2], hitbox[3]
+        self.__points[slot] = points
+        self.__images[slot] = image
+        self.__active[slot] = True
+
+    def clear(self):
+        # Removes all asteroids
+        self.__free(self.__active.copy())
+
+    def draw(self, alpha: float = 1):
+        # Draws all asteroids in one batch, returns the areas of the window they
+        # cover. The asteroids are drawn in between their previous and current
+        # position (see Robot.draw()).
+        if alpha == 1:
+            x = self.__x.tolist()
+            y = self.__y.tolist()
+        else:
+            x = (self.__x - self.__x_speed * (1 - alpha)).tolist()
+            y = (self.__y - self.__y_speed * (1 - alpha)).tolist()
+        return self.__window.blits(
+            [(self.__images[i], (x[i], y[i])) for i in np.flatnonzero(self.__active)]
+        )
+
+    def step(self, robot_hitbox: pygame.Rect):
+        # Moves all asteroids and checks them for collision with the robot.
+        # Asteroids that collide with the robot are worth points, asteroids
+        # that fall through the lower border of the screen cost a life. Both
+        # are removed from the field. Returns a tuple with the number of points
+        # scored and the number of lives lost.
+        np.add(self.__x, self.__x_speed, out=self.__x)
+        np.add(self.__y, self.__y_speed, out=self.__y)
+        # Collision of the hitboxes with the robot hitbox (same condition as
+        # pygame.Rect.colliderect())
+        left = self.__x + self.__hitbox_x
+        top = self.__y + self.__hitbox_y
+        hit = (
+            self.__active
+            & (left < robot_hitbox.right)
+            & (left + self.__hitbox_w > robot_hitbox.left)
+            & (top < robot_hitbox.bottom)
+            & (top + self.__hitbox_h > robot_hitbox.top)
+        )
+        # Asteroids below the lower border of the screen
+        missed = self.__active & (self.__y > self.__window_h + 1) & ~hit
+        points = int(self.__points[hit].sum())
+        lives_lost = int(missed.sum())
+        # Remove asteroids that have been hit or missed
+        if points or lives_lost:
+            self.__free(hit | missed)
+        return points, lives_lost
+
+    def __free(self, removed: np.ndarray):
+        # Marks the slots as free. Free slots don't move.
+        self.__active[removed] = False
+        self.__x_speed[removed] = 0
+        self.__y_speed[removed] = 0
+        for slot in np.flatnonzero(removed).tolist():
+            self.__images[slot] = None
+            self.__free_slots.append(slot)
+
+    def __grow(self):
+        # Doubles the capacity of the field
+        capacity = len(self.__images)
+        self.__x = np.concatenate((self.__x, np.zeros(capacity)))
+        self.__y = np.concatenate((self.__y, np.zeros(capacity)))
+        self.__x_speed = np.concatenate((self.__x_speed, np.zeros(capacity)))
+        self.__y_speed = np.concatenate((self.__y_speed, np.zeros(capacity)))
+        self.__hitbox_x = np.concatenate((self.__hitbox_x, np.zeros(capacity)))
+        self.__hitbox_y = np.concatenate((self.__hitbox_y, np.zeros(capacity)))
+        self.__hitbox_w = np.concatenate((self.__hitbox_w, np.zeros(capacity)))
+        self.__hitbox_h = np.concatenate((self.__hitbox_h, np.zeros(capacity)))
+        self.__points = np.concatenate((self.__points, np.zeros(capacity, dtype=int)))
+        self.__active = np.concatenate((self.__active, np.zeros(capacity, dtype=bool)))
+        self.__images.extend([None] * capacity)
+        self.__free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+
+class HeartPool:
+    # Fixed number of reusable Heart objects. Spawning a heart resets a free
+    # heart instead of creating a new object, and hearts that have been grabbed
+    # or have fallen off the screen are marked as free again. Hearts spawn
+    # when a certain score is reached (see AsteroidGame.__spawner()). The
+    # score at which every heart spawned is kept, so no more hearts spawn at
+    # that score while the heart is still falling.
+    def __init__(
+        self, window: pygame.surface.Surface, random: SessionRandom, capacity: int = 8
+    ):
+        self.__hearts = [Heart(window, random) for _ in range(capacity)]
+        self.__active = [False] * capacity
+        # Whether or not the heart collided with the robot in the previous frame
+        self.__collided = [False] * capacity
+        self.__scores = [0] * capacity
+
+    def spawned_at(self, score: int):
+        # True if a heart that spawned at this score is still falling
+        for i in range(len(self.__hearts)):
+            if self.__active[i] and self.__scores[i] == score:
+                return True
+        return False
+
+    def spawn(self, score: int):
+        # Spawns a heart in a free slot (nothing happens when there is none)
+        for i in range(len(self.__hearts)):
+            if not self.__active[i]:
+                self.__hearts[i].reset()
+                self.__active[i] = True
+                self.__collided[i] = False
+                self.__scores[i] = score
+                return
+
+    def collected(self):
+        # Number of hearts that collided with the robot in the previous frame
+        return sum(
+            1
+            for i in range(len(self.__hearts))
+            if self.__active[i] and self.__collided[i]
+        )
+
+    def cull(self):
+        # Frees the slots of the hearts that have gone offscreen (which is also
+        # where hearts end up after colliding with the robot)
+        for i in range(len(self.__hearts)):
+            if self.__active[i] and not self.__hearts[i].on_screen():
+                self.__active[i] = False
+
+    def clear(self):
+        # Frees all slots
+        self.__active = [False] * len(self.__hearts)
+
+    def fall(self, robot: Robot):
+        # Lets all hearts fall and checks them for collision with the robot
+        for i in range(len(self.__hearts)):
+            if self.__active[i]:
+                self.__hearts[i].fall()
+                if self.__hearts[i].collision(robot):
+                    self.__collided[i] = True
+
+    def draw(self, alpha: float = 1):
+        # Draws the hearts that are falling (not the ones that have been
+        # grabbed), returns the areas of the window they cover
+        rects = []
+        for i in range(len(self.__hearts)):
+            if self.__active[i] and not self.__collided[i]:
+                rects.append(self.__hearts[i].draw(alpha))
+        return rects
 
 
 class Heart(Asteroid):
     # This class can create Heart objects, which are hearts falling from the sky that
     # will increase the player's number of lives. It behaves like the asteroid class,
     # so it has been made as a subclass of that.
-    def __init__(self, window: pygame.surface.Surface):
-        super().__init__(window)
+    __slots__ = ()
+
+    def reset(self):
+        super().reset()
         # Image not imported from superclass because it's not randomized here
-        self._object = pygame.image.load("heart.png")
+        self._object = ImageCache.load("heart.png")
         # Speed is always the same, unlike for asteroids, and they always fall
         # straight down and don't rotate
         self._y_speed = Asteroid.speed
@@ -328,17 +1092,72 @@ class FileHandler:
 
 
 class AsteroidGame:
-    def __init__(self):
+    # Game states
+    paused, playing, game_over, restart = 0, 1, -1, 2
+
+    def __init__(
+        self,
+        record: str = None,
+        replay: str = None,
+        seed: int = None,
+        profile: str = None,
+        profiler: FrameProfiler = None,
+    ):
+        # Start pygame (once per process, restarting the game doesn't need it)
+        pygame.init()
         # Game name
         self.__name = "Asteroids"
+        # Input log. When recording, the inputs are saved to the file 'record'
+        # when the game is closed. When replaying, the inputs come from the
+        # file 'replay' instead of the keyboard, and the game runs as fast as
+        # possible on an offscreen surface (no display needed). The seed of
+        # the random number generator comes from the log when replaying, and
+        # is random unless given otherwise.
+        self.__record_file = record
+        self.__recording = record is not None
+        self.__replaying = replay is not None
+        if self.__replaying:
+            self.__input_log = InputLog.load(replay)
+        else:
+            self.__input_log = InputLog(randrange(2**32) if seed is None else seed)
+        # Random number generator of the session
+        self.__random = SessionRandom(self.__input_log.seed)
+        # Number of frames simulated (over all games)
+        self.__ticks = 0
+        # Frame time profiler, its overlay is toggled with 'F3'. The frame
+        # times are written to the file 'profile' (if given). A profiler of
+        # its own can be passed instead (e.g. by the benchmark).
+        if profiler is None:
+            profiler = FrameProfiler(profile)
+        self.__profiler = profiler
         # Setting up the window
         self.__window_w = 640
         self.__window_h = 480
-        self.__window = pygame.display.set_mode((self.__window_w, self.__window_h))
+        if self.__replaying:
+            self.__window = pygame.Surface((self.__window_w, self.__window_h))
+        else:
+            self.__window = pygame.display.set_mode((self.__window_w, self.__window_h))
+        # Render the asteroid images in advance (normal and 1.5 times the size),
+        # so spawning an asteroid doesn't have to process an image
+        Asteroid.atlas.prerender(Asteroid.scales, (1, 1.5))
         # Background color is black
         self.__bg_color = (0, 0, 0)
+        self.__background = pygame.Surface((self.__window_w, self.__window_h))
+        self.__background.fill(self.__bg_color)
+        # Renderer that only updates the parts of the window that changed. Set
+        # enabled to False to redraw the whole window every frame instead.
+        self.__renderer = DirtyRectRenderer(self.__window, enabled=True)
+        self.__renderer.set_background(self.__background)
         # Settin up the playable robot
         self.__robot = Robot(self.__window)
+        # Asteroids and hearts (both are pools of reusable slots that are
+        # cleared when a new game starts)
+        self.__asteroids = AsteroidField(self.__window, self.__random)
+        self.__hearts = HeartPool(self.__window, self.__random)
+        # Set the different fonts for ingame and the game over text
+        self.__game_font1 = pygame.font.SysFont("Arial", 20)
+        self.__game_font2 = pygame.font.SysFont("Arial", 40)
+        self.__game_font3 = pygame.font.SysFont("Arial", 15)
         # Default controls
         self.__controls = {
             "move_left": pygame.K_a,
@@ -346,10 +1165,16 @@ class AsteroidGame:
             "run": pygame.K_w,
             "jump": pygame.K_SPACE,
             "pause": pygame.K_ESCAPE,
+            "profiler": pygame.K_F3,
         }
         # Setting up the game clock and fps
+        # (the frame rate is limited to fps, the game itself runs at a fixed
+        # tick rate, see FixedStepClock). Replays run one tick per frame.
         self.__clock = pygame.time.Clock()
-        self.__fps = 60
+        self.__fps = 144
+        self.__tick_rate = 60
+        self.__step_clock = FixedStepClock(self.__tick_rate)
+        self.__step_clock.lockstep = self.__replaying
 
         self.__filehandler = FileHandler("highscore.txt")
 
@@ -372,6 +1197,8 @@ class AsteroidGame:
                         inputs["is_double_jumping"] = True
                 if event.key == self.__controls["pause"]:
                     inputs["pause_status_change"] = True
+                if event.key == self.__controls["profiler"]:
+                    self.__profiler.visible = not self.__profiler.visible
 
             if event.type == pygame.KEYUP:
                 if event.key == self.__controls["move_left"]:
@@ -382,7 +1209,20 @@ class AsteroidGame:
                     inputs["is_running"] = False
 
             if event.type == pygame.QUIT:
-                exit()
+                self.__quit()
+
+    def __quit(self):
+        # Saves the input log (when recording) and closes the game
+        if self.__recording:
+            self.__input_log.save(self.__record_file)
+        self.__profiler.close()
+        exit()
+
+    def __end_tick(self, inputs: dict):
+        # Ends the current frame of the simulation
+        if self.__recording:
+            self.__input_log.end_tick(self.__ticks, inputs)
+        self.__ticks += 1
 
     def __ingame_text(
         self,
@@ -396,23 +1236,23 @@ class AsteroidGame:
         score_color = (255, 0, 0)
         lives_color = (50, 205, 50)
         # Text objects for score and lives
-        score_text = text_font1.render(f"Score: {score}", True, score_color)
-        high_score_text = text_font2.render(
-            f"(High score: {high_score})", True, score_color
+        score_text = TextCache.render(text_font1, f"Score: {score}", True, score_color)
+        high_score_text = TextCache.render(
+            text_font2, f"(High score: {high_score})", True, score_color
         )
-        lives_text = text_font1.render(f"+", True, score_color)
+        lives_text = TextCache.render(text_font1, f"+", True, score_color)
         # Blit
-        self.__window.blit(score_text, (500, 20))
-        self.__window.blit(high_score_text, (500, 45))
+        self.__renderer.blit(score_text, (500, 20))
+        self.__renderer.blit(high_score_text, (500, 45))
         # Display lives as hearts
-        heart_object = pygame.image.load("heart.png")
+        heart_object = ImageCache.load("heart.png")
         for i in range(lives):
             if i > 10:
-                self.__window.blit(
+                self.__renderer.blit(
                     lives_text, (30 + heart_object.get_width() * 11 + 3, 14)
                 )
             else:
-                self.__window.blit(
+                self.__renderer.blit(
                     heart_object, (30 + heart_object.get_width() * i, 20)
                 )
 
@@ -437,13 +1277,13 @@ class AsteroidGame:
         # Set text color
         text_color = (255, 255, 255)
         # Create text object
-        text = text_font.render(
-            "Game paused. Press 'Esc' to continue...", True, text_color
+        text = TextCache.render(
+            text_font, "Game paused. Press 'Esc' to continue...", True, text_color
         )
         # Create rectangle for text object so it can be centered easily
         text_rect = text.get_rect(center=(self.__window_w / 2, self.__window_h / 2))
         # Create on display
-        self.__window.blit(text, text_rect)
+        self.__renderer.blit(text, text_rect)
 
     def __game_over_handler(
         self, lives: int, score: int, high_score: int, state: int, inputs: dict
@@ -455,13 +1295,13 @@ class AsteroidGame:
             if state != -1:
                 return -1
             # If the game is in game-over state, check if the player presses the
-            # 'Esc' key. Execute a new game.
+            # 'Esc' key. Signal that a new game should start.
             else:
                 if inputs["pause_status_change"]:
-                    if score > high_score:
+                    if score > high_score and not self.__replaying:
                         self.__filehandler.save_file(score)
                     inputs["pause_status_change"] = False  # TODO might not be necessary
-                    self.execute()
+                    return self.restart
         return state
 
     def __game_over_menu(
@@ -470,96 +1310,93 @@ class AsteroidGame:
         # Set text color
         text_color = (255, 255, 255)
         # Create header and text object
-        header = header_font.render("GAME OVER", True, text_color)
-        text = text_font.render("Press 'Esc' to restart", True, text_color)
+        header = TextCache.render(header_font, "GAME OVER", True, text_color)
+        text = TextCache.render(text_font, "Press 'Esc' to restart", True, text_color)
         # Create rectangles for easy centering
         header_rect = header.get_rect(center=(self.__window_w / 2, 220))
         text_rect = text.get_rect(center=(self.__window_w / 2, 270))
         # Create on display
-        self.__window.blit(header, header_rect)
-        self.__window.blit(text, text_rect)
+        self.__renderer.blit(header, header_rect)
+        self.__renderer.blit(text, text_rect)
 
-    def __spawner(self, score: int, asteroids: list, hearts: dict):
+    def __spawner(self, score: int, asteroids: AsteroidField, hearts: HeartPool):
         # ASTEROIDS
         # Base spawn chance (out of 1000), increases gradually with points scored
         base_spawn_chance = 8
         spawn_chance = base_spawn_chance + (score / 5)
-        if randint(0, 1000) < spawn_chance:
-            asteroids.append([Asteroid(self.__window), False])
+        if self.__random.randint("spawn", 0, 1000) < spawn_chance:
+            asteroids.spawn()
 
         # HEARTS
         # Spawn every 10 points scored + variable factor dependent on score
         # The higher the score, the less hearts spawn. At 1000 score, no more
         # hearts spawn
         heart_spawn_chance = 1010 - score
-        if score % 10 == 0 and score != 0 and score not in hearts.keys():
-            if randint(0, 1000) < heart_spawn_chance:
-                hearts[score] = [Heart(self.__window), False]
-
-    def __updated_score(self, score: int, asteroids: list):
-        # See description in updated_lives(). Checks the bool in index [1] of
-        # an entry in the list. If True, then score increases.
-        for asteroid in asteroids:
-            if asteroid[1]:
-                score += asteroid[0].points
-        return score
-
-    def __updated_lives(self, lives: int, asteroids: list, hearts: dict):
-        # The items in the asteroids list are 2-item lists. The first item in this
-        # sublist contains the asteroid object, the second contains a bool stating
-        # whether or not the object has collided with the player in the previous
-        # frame.
-        # When the asteroid has gone offscreen, it can either be because the player
-        # collided with it (no loss of a life) or because it fell through the lower
-        # border of the screen (loss of a life)
-        for asteroid in asteroids:
-            if not asteroid[0].on_screen() and not asteroid[1]:
-                lives -= 1
-        # When hearts collide with the robot, the number of lives increases by 1.
-        # Values in the hearts dict have the followin structure:
-        # hearts[spawn_time] = [Heart(), bool(collision with player in previous frame?)]
-        for heart in hearts.values():
-            if heart[1]:
-                lives += 1
-        return lives
-
-    def __delete_offscreen_objects(self, asteroids: list, hearts: dict):
-        # Remove offscreen asteroids from list
-        asteroids = [asteroid for asteroid in asteroids if asteroid[0].on_screen()]
-        # Remove offscreen hearts from dict
-        for k in list(hearts.keys()):
-            if not hearts[k][0].on_screen():
-                del hearts[k]
-        return asteroids, hearts
-
-    def __collision_check(self, asteroids: list, hearts: dict):
+        if score % 10 == 0 and score != 0 and not hearts.spawned_at(score):
+            if self.__random.randint("spawn", 0, 1000) < heart_spawn_chance:
+                hearts.spawn(score)
+
+    def __updated_lives(self, lives: int, hearts: HeartPool):
+        # When hearts collide with the robot, the number of lives increases by 1
+        # (lives lost because of asteroids are counted by the AsteroidField)
+        return lives + hearts.collected()
+
+    def __collision_check(self, asteroids: AsteroidField, hearts: HeartPool):
         # ASTEROID COLLISION CHECK
-        for asteroid in asteroids:
-            # Let asteroid fall
-            asteroid[0].fall()
-            # Check for collision, adjust variable on index[1] accordingly
-            # (default [1] = False, after collision [1] = True)
-            if asteroid[0].collision(self.__robot):
-                asteroid[1] = True
+        # Let all asteroids fall and check for collision in one step. Returns
+        # the points scored and the lives lost.
+        asteroid_result = asteroids.step(self.__robot.get_hitbox())
 
         # HEART COLLISION CHECK
-        for heart in hearts.values():
-            # Let heart fall
-            heart[0].fall()
-            # Check for collision, see above
-            if heart[0].collision(self.__robot):
-                heart[1] = True
-
-    def execute(self):
-        # Start pygame
-        pygame.init()
-        self.__robot.reset()
+        hearts.fall(self.__robot)
+
+        return asteroid_result
+
+    def __draw_objects(self, asteroids: AsteroidField, hearts: HeartPool):
+        # Draws the robot, asteroids and hearts in between their previous and
+        # current position
+        alpha = self.__step_clock.alpha
+        self.__renderer.mark(self.__robot.draw(alpha))
+        for rect in asteroids.draw(alpha):
+            self.__renderer.mark(rect)
+        for rect in hearts.draw(alpha):
+            self.__renderer.mark(rect)
+
+    def execute(self, max_restarts: int = None):
         # Display the game name in the caption
-        pygame.display.set_caption(self.__name)
-        # Set the different fonts for ingame and the game over text
-        game_font1 = pygame.font.SysFont("Arial", 20)
-        game_font2 = pygame.font.SysFont("Arial", 40)
-        game_font3 = pygame.font.SysFont("Arial", 15)
+        if not self.__replaying:
+            pygame.display.set_caption(self.__name)
+        # Every iteration is one game, a new game starts when the player
+        # restarts after game over. Stops when the replay ends, or after
+        # max_restarts restarts (if given, e.g. for a soak test, calling
+        # execute() again carries on with the next game). Returns the number
+        # of restarts.
+        restarts = 0
+        while self.__play():
+            restarts += 1
+            if restarts == max_restarts:
+                break
+        self.__profiler.close()
+        return restarts
+
+    @property
+    def ticks(self):
+        # Number of frames simulated
+        return self.__ticks
+
+    def __play(self):
+        # Plays one game. Returns True when the player restarts, and False
+        # when the replay of the input log is over.
+        # Reset the robot, asteroids and hearts of the previous game
+        self.__robot.reset()
+        self.__asteroids.clear()
+        self.__hearts.clear()
+        # Start with a clean window
+        self.__renderer.invalidate()
+        # Fonts
+        game_font1 = self.__game_font1
+        game_font2 = self.__game_font2
+        game_font3 = self.__game_font3
         # Game inputs. Set to false at the start of every game.
         game_inputs = {
             "to_left": False,
@@ -573,15 +1410,11 @@ class AsteroidGame:
         player_score = 0
         player_lives = 3
         # State of the game. Starting state = playing
-        paused, playing, game_over = 0, 1, -1
+        paused, playing, game_over = self.paused, self.playing, self.game_over
         game_state = playing
-        # Asteroids (list) and hearts (dict) currently spawned. A dict
-        # for hearts is used to link the heart object to a score. Hearts
-        # spawn when a certain score is reached. We don't want hearts to
-        # keep spawning at this score. The score is used as key in the
-        # dictionary, so it can be checked to avoid double spawns.
-        spawned_asteroids = []
-        spawned_hearts = {}
+        # Asteroids and hearts currently spawned
+        spawned_asteroids = self.__asteroids
+        spawned_hearts = self.__hearts
         # Loading highscore from file
         try:
             high_score = self.__filehandler.load_file()
@@ -589,49 +1422,112 @@ class AsteroidGame:
             high_score = 0
 
         while True:
-            # Register the inputs
-            self.__register_inputs(game_inputs)
-            # Check pause and game-over state conditions, and change game state accordingly
-            game_state = self.__pause_handler(game_state, game_inputs)
-            game_state = self.__game_over_handler(
-                player_lives, player_score, high_score, game_state, game_inputs
-            )
-            # Fill the window with the set background color
-            self.__window.fill(self.__bg_color)
+            self.__profiler.begin_frame()
+            # Register the inputs (when replaying, they come from the input log)
+            if not self.__replaying:
+                self.__register_inputs(game_inputs)
+            self.__profiler.lap("input")
+
+            # Advance the game by the number of ticks that fit in the time since
+            # the previous frame
+            for _ in range(self.__step_clock.ticks()):
+                if self.__replaying:
+                    if self.__input_log.finished(self.__ticks):
+                        return False
+                    self.__input_log.replay(self.__ticks, game_inputs)
+                elif self.__recording:
+                    self.__input_log.record(self.__ticks, game_inputs)
+                # Check pause and game-over state conditions, and change game state accordingly
+                game_state = self.__pause_handler(game_state, game_inputs)
+                game_state = self.__game_over_handler(
+                    player_lives, player_score, high_score, game_state, game_inputs
+                )
+                if game_state == self.restart:
+                    self.__end_tick(game_inputs)
+                    return True
+                if game_state == playing:
+                    # Robot registers controls
+                    self.__robot.play(game_inputs)
+                    # Spawner of hearts and asteroids
+                    self.__spawner(player_score, spawned_asteroids, spawned_hearts)
+                    # New value for lives is calculated (hearts)
+                    player_lives = self.__updated_lives(player_lives, spawned_hearts)
+                    # Free offscreen hearts after lives update
+                    spawned_hearts.cull()
+                    # Collision checker, new value for score and lives is
+                    # calculated (asteroids)
+                    points, lives_lost = self.__collision_check(
+                        spawned_asteroids, spawned_hearts
+                    )
+                    player_score += points
+                    player_lives -= lives_lost
+                self.__end_tick(game_inputs)
+            self.__profiler.lap("physics")
+
+            # Restore the background color where things have been drawn in
+            # the previous frame
+            self.__renderer.begin_frame()
+            self.__profiler.lap("world")
 
             # PLAYING / PAUSED / GAME OVER GAME STATES
             if game_state == playing:
-                # Robot registers controls
-                self.__robot.play(game_inputs)
-                # Spawner of hearts and asteroids
-                self.__spawner(player_score, spawned_asteroids, spawned_hearts)
-                # New value for score and lives is calculated
-                player_score = self.__updated_score(player_score, spawned_asteroids)
-                player_lives = self.__updated_lives(
-                    player_lives, spawned_asteroids, spawned_hearts
-                )
-                # Delete spawned after score/lives update
-                spawned_asteroids, spawned_hearts = self.__delete_offscreen_objects(
-                    spawned_asteroids, spawned_hearts
-                )
-                # Collision checker
-                self.__collision_check(spawned_asteroids, spawned_hearts)
+                self.__draw_objects(spawned_asteroids, spawned_hearts)
+                self.__profiler.lap("entities")
                 # Create game text
                 self.__ingame_text(
                     player_score, high_score, player_lives, game_font1, game_font3
                 )
-            elif game_state == paused:
-                self.__pause_menu(game_font1)
-            elif game_state == game_over:
-                self.__game_over_menu(game_font1, game_font2)
+            else:
+                # Don't catch up with the time spent paused
+                self.__step_clock.reset()
+                if game_state == paused:
+                    self.__pause_menu(game_font1)
+                elif game_state == game_over:
+                    self.__game_over_menu(game_font1, game_font2)
+            # Display the frame time overlay if it is toggled
+            if self.__profiler.visible:
+                self.__profiler.draw(self.__renderer, game_font3, (20, 60))
+            self.__profiler.lap("hud")
 
             # Frame generation
-            pygame.display.flip()
-            self.__clock.tick(self.__fps)
+            self.__renderer.present()
+            self.__profiler.lap("present")
+            self.__profiler.end_frame()
+            if not self.__replaying:
+                self.__clock.tick(self.__fps)
 
 
 def main():
-    AsteroidGame().execute()
+    parser = argparse.ArgumentParser(description="Asteroids")
+    parser.add_argument(
+        "--record", metavar="FILE", help="record the inputs of the session to FILE"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="replay the inputs recorded in FILE as fast as possible, without a display",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write the frame times to FILE (CSV if it ends with .csv, else JSONL)",
+    )
+    args = parser.parse_args()
+
+    if args.replay is None:
+        AsteroidGame(record=args.record, profile=args.profile).execute()
+        return
+
+    # Replay without opening a window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    game = AsteroidGame(replay=args.replay, profile=args.profile)
+    start = time.perf_counter()
+    game.execute()
+    seconds = time.perf_counter() - start
+    print(
+        f"Replayed {game.ticks} ticks in {seconds:.2f} s "
+        f"({game.ticks / seconds:.0f} ticks/s)"
+    )
 
 
 if __name__ == "__main__":